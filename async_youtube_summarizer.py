@@ -0,0 +1,210 @@
+import asyncio
+import json
+import os
+import weakref
+from contextlib import asynccontextmanager
+
+import httpx
+
+from text_chunks import split_text
+from transcript_prefetch import fetch_and_store_transcript
+from youtube_summarizer import SummaryResult, YouTubeSummarizer
+
+
+class AsyncYouTubeSummarizer(YouTubeSummarizer):
+    """
+    Summarizes transcripts of YouTube videos without blocking the event loop,
+    e.g. inside the tools of an ADK agent.
+
+    Chat completions use a pooled httpx.AsyncClient per event loop.
+    The SQLite database and the transcript API are blocking, they run in worker threads.
+    """
+
+    retries = 3
+    backoff_factor = 0.5
+    retry_statuses = (429, 500, 502, 503, 504)
+    timeout = httpx.Timeout(300.0, connect=10.0)
+
+    # An AsyncClient must not be shared between event loops.
+    async_clients = weakref.WeakKeyDictionary()
+    async_client_users = weakref.WeakKeyDictionary()
+
+    @classmethod
+    def async_client(cls) -> httpx.AsyncClient:
+        loop = asyncio.get_running_loop()
+        client = cls.async_clients.get(loop)
+        if client is None:
+            # The client ignores its own limits when it gets a transport.
+            client = httpx.AsyncClient(timeout=cls.timeout, transport=httpx.AsyncHTTPTransport(
+                retries=cls.retries, limits=httpx.Limits(max_connections=100, max_keepalive_connections=16)))
+            cls.async_clients[loop] = client
+        return client
+
+    @classmethod
+    @asynccontextmanager
+    async def pooled_client(cls):
+        """
+        Closes the client of the running event loop when the last of the nested pooled_client blocks ends.
+        Without it the client lives as long as the event loop, e.g. for the tools of a long-running agent.
+        Summaries running outside of the blocks on the same event loop may lose their connections then.
+        """
+        loop = asyncio.get_running_loop()
+        cls.async_client_users[loop] = cls.async_client_users.get(loop, 0) + 1
+        try:
+            yield cls.async_client()
+        finally:
+            cls.async_client_users[loop] -= 1
+            if cls.async_client_users[loop] == 0:
+                client = cls.async_clients.pop(loop, None)
+                if client is not None:
+                    await client.aclose()
+
+    async def fetch_transcript_async(self):
+        """
+        Like fetch_transcript but does the database and network access in a worker thread.
+        """
+        store = self.transcript_store()
+        row = await asyncio.to_thread(store.get, self.video_id)
+        if row is None and self.video_id not in await asyncio.to_thread(store.missing_ids, [self.video_id]):
+            row = await asyncio.to_thread(fetch_and_store_transcript, store, self.video_id)
+        if row is None:
+            raise Exception("transcript not found")
+        self.language, self.transcript_text = row
+
+    async def post_with_retries(self, request: dict) -> httpx.Response:
+        api_key = os.getenv("OPENAI_API_KEY")
+        for attempt in range(self.retries + 1):
+            response = await self.async_client().post(self.url, json=request,
+                                                      headers={"Authorization": f"Bearer {api_key}"})
+            if response.status_code not in self.retry_statuses or attempt == self.retries:
+                return response
+            retry_after = response.headers.get("Retry-After", "")
+            delay = float(retry_after) if retry_after.isdigit() else self.backoff_factor * 2 ** attempt
+            await asyncio.sleep(delay)
+
+    async def summarize_text_async(self, input_text: str, prompt_selector: str):
+        request, cache_key = self.build_request(input_text, prompt_selector)
+        if cache_key is not None:
+            cached_response = await asyncio.to_thread(self.response_cache().get, cache_key)
+            if cached_response is not None:
+                return cached_response
+
+        response = await self.post_with_retries(request)
+        response.raise_for_status()
+
+        json_result = json.loads(response.text)
+        content = json_result.get("choices")[0].get("message").get("content")
+        if prompt_selector == "combined":
+            self.parse_combined(content)
+        if cache_key is not None:
+            await asyncio.to_thread(self.response_cache().put, cache_key, content, self.model, prompt_selector)
+        return content
+
+    async def summarize_chunks_async(self, chunks: list[str]) -> list[str]:
+        limit = asyncio.Semaphore(self.max_parallel_chunks)
+
+        async def summarize_chunk(chunk: str) -> str:
+            async with limit:
+                return await self.summarize_text_async(chunk, "chunk")
+
+        return list(await asyncio.gather(*(summarize_chunk(chunk) for chunk in chunks)))
+
+    async def condense_text_async(self, input_text: str) -> str:
+        """
+        Same as condense_text but summarizes the chunks concurrently on the event loop.
+        """
+        if len(input_text) <= self.max_transcript_length:
+            return input_text
+        partials = await self.summarize_chunks_async(
+            split_text(input_text, self.max_transcript_length, self.chunk_overlap))
+        for _ in range(self.max_reduction_levels):
+            if self.joined_length(partials) <= self.max_transcript_length:
+                break
+            condensed = await self.summarize_chunks_async(self.group_partials(partials))
+            if self.joined_length(condensed) >= self.joined_length(partials):
+                break
+            partials = condensed
+        return "\n\n".join(partials)
+
+    async def summarize_async(self) -> dict:
+        """
+        Summarizes the transcript and returns a dict with fields language, title and summary.
+        Unlike summarize() no final-summary.md is written.
+        """
+        with self.timed("transcript"):
+            await self.fetch_transcript_async()
+        if self.title_mode == "combined":
+            with self.timed("summary"):
+                input_text = await self.condense_text_async(self.transcript_text)
+                try:
+                    self.summary_text, self.title_text = self.parse_combined(
+                        await self.summarize_text_async(input_text, "combined"))
+                except ValueError:
+                    # Like summarize_combined, the serial mode if the model doesn't answer with the JSON object.
+                    self.summary_text = await self.summarize_text_async(input_text, "summary")
+                    self.title_text = await self.summarize_text_async(self.summary_text, "title")
+        elif self.title_mode == "parallel":
+            title_task = asyncio.create_task(
+                self.summarize_text_async(self.transcript_text[:self.title_input_length], "title"))
+            try:
+                with self.timed("summary"):
+                    input_text = await self.condense_text_async(self.transcript_text)
+                    self.summary_text = await self.summarize_text_async(input_text, "summary")
+                with self.timed("title"):
+                    self.title_text = await title_task
+            finally:
+                title_task.cancel()
+        else:
+            with self.timed("summary"):
+                input_text = await self.condense_text_async(self.transcript_text)
+                self.summary_text = await self.summarize_text_async(input_text, "summary")
+            with self.timed("title"):
+                self.title_text = await self.summarize_text_async(self.summary_text, "title")
+        return {
+            "language": self.language,
+            "title": self.title_text,
+            "summary": self.summary_text
+        }
+
+
+async def summarize_many_async(video_ids, concurrency: int = 8):
+    """
+    Summarizes many videos on the running event loop, at most concurrency at the same time.
+
+    :return: async generator of SummaryResult in the order the videos are finished
+    """
+    limit = asyncio.Semaphore(concurrency)
+
+    async def summarize_one(video_id: str) -> SummaryResult:
+        async with limit:
+            try:
+                summary = await AsyncYouTubeSummarizer(video_id).summarize_async()
+                return SummaryResult(video_id, summary["language"], summary["title"], summary["summary"])
+            except Exception as e:
+                return SummaryResult(video_id, error=e)
+
+    async with AsyncYouTubeSummarizer.pooled_client():
+        tasks = [asyncio.create_task(summarize_one(video_id)) for video_id in dict.fromkeys(video_ids)]
+        try:
+            for task in asyncio.as_completed(tasks):
+                yield await task
+        finally:
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+
+
+async def summarize_youtube_video(video_id: str) -> dict:
+    """Summarizes a YouTube video by its transcript.
+
+    Args:
+        video_id (str): The ID of the video at YouTube, e.g. "dMcZPkYUBxU" for https://www.youtube.com/watch?v=dMcZPkYUBxU.
+
+    Returns:
+        dict: status and language, title and summary or error msg.
+    """
+    try:
+        summary = await AsyncYouTubeSummarizer(video_id).summarize_async()
+    except Exception as e:
+        return {"status": "error", "error_message": f"The video {video_id} could not be summarized: {e}"}
+    return {"status": "success", **summary}
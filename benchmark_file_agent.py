@@ -0,0 +1,40 @@
+# Compares the per-call overhead of execute_task_on_file_by_name before and after reusing the file agent:
+# building a new LlmAgent and AgentTool for every call against looking up the shared tool.
+# The model is not called, only the preparation of a call is measured.
+# Usage: python benchmark_file_agent.py [calls]
+
+import statistics
+import sys
+import time
+
+from google.adk.tools.agent_tool import AgentTool
+
+from summarize_agent import get_agent_tool, get_file_agent
+
+CALLS = int(sys.argv[1]) if len(sys.argv) > 1 else 1000
+REPEATS = 5
+
+
+def new_tool() -> AgentTool:
+    return AgentTool(get_file_agent())
+
+
+def shared_tool() -> AgentTool:
+    return get_agent_tool("file_agent", get_file_agent)
+
+
+def measure(prepare) -> float:
+    """
+    Returns the mean time per call in microseconds.
+    """
+    start = time.perf_counter()
+    for _ in range(CALLS):
+        prepare()
+    return (time.perf_counter() - start) / CALLS * 1e6
+
+
+if __name__ == "__main__":
+    for name, prepare in [("new agent per call", new_tool), ("shared agent", shared_tool)]:
+        durations = [measure(prepare) for _ in range(REPEATS)]
+        print(f"{name:>18}: median {statistics.median(durations):8.1f}µs, "
+              f"min {min(durations):8.1f}µs, max {max(durations):8.1f}µs per call")
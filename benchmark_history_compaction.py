@@ -0,0 +1,83 @@
+# Compares the prompt tokens per loop iteration and the wall-clock time of loop-agent.py and pro-contra-agent-en.py
+# with the full conversation history and with history compaction.
+# The requests are recorded during the runs and their tokens are counted afterwards, so counting doesn't add
+# to the measured time. Needs GOOGLE_API_KEY like the agents.
+# Usage: python benchmark_history_compaction.py [loop-agent.py|pro-contra-agent-en.py ...]
+
+import importlib.util
+import sys
+import time
+from collections import defaultdict
+
+from google import genai
+from google.adk.runners import Runner
+from google.adk.sessions import InMemorySessionService
+from google.genai import types
+
+SCRIPTS = sys.argv[1:] or ["loop-agent.py", "pro-contra-agent-en.py"]
+
+
+def load_script(path: str):
+    # The file names contain hyphens, they can't be imported by name.
+    spec = importlib.util.spec_from_file_location(path.removesuffix(".py").replace("-", "_"), path)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+def run(module, compact_history: bool):
+    """
+    Runs the loop once and returns the recorded requests as (iteration, agent name, contents) and the duration.
+    """
+    # Both runs take all iterations, an early stop would make them incomparable.
+    loop_agent = module.create_loop_agent(compact_history, stop_on_convergence=False)
+    requests = []
+    iteration = 0
+
+    def record_request(callback_context, llm_request):
+        nonlocal iteration
+        if callback_context.agent_name == loop_agent.sub_agents[0].name:
+            iteration += 1
+        instruction = types.Content(role="user", parts=[types.Part.from_text(
+            text=str(llm_request.config.system_instruction or ""))])
+        requests.append((iteration, callback_context.agent_name, [instruction] + list(llm_request.contents)))
+
+    for agent in loop_agent.sub_agents:
+        if hasattr(agent, "before_model_callback"):
+            agent.before_model_callback = record_request
+
+    query = getattr(module, "STATEMENT", "execute")
+    state = {module.STATE_STATEMENT: query} if hasattr(module, "STATE_STATEMENT") else {}
+    session_service = InMemorySessionService()
+    session = session_service.create_session(app_name=module.APP_NAME, user_id=module.USER_ID, state=state)
+    runner = Runner(agent=loop_agent, app_name=module.APP_NAME, session_service=session_service)
+    start = time.perf_counter()
+    for _ in runner.run(user_id=session.user_id, session_id=session.id,
+                        new_message=types.Content(role="user", parts=[types.Part(text=query)])):
+        pass
+    return requests, time.perf_counter() - start
+
+
+def tokens_per_iteration(client: genai.Client, model: str, requests) -> dict:
+    tokens = defaultdict(int)
+    for iteration, _, contents in requests:
+        tokens[iteration] += client.models.count_tokens(model=model, contents=contents).total_tokens
+    return tokens
+
+
+if __name__ == "__main__":
+    client = genai.Client()
+    for script in SCRIPTS:
+        module = load_script(script)
+        results = {}
+        for compact_history in (False, True):
+            requests, duration = run(module, compact_history)
+            results[compact_history] = (tokens_per_iteration(client, module.GEMINI_MODEL, requests), duration)
+
+        print(f"{script}: prompt tokens per iteration")
+        (full_tokens, full_duration), (compact_tokens, compact_duration) = results[False], results[True]
+        print(f"{'iteration':>9} {'full':>8} {'compact':>8}")
+        for iteration in sorted(set(full_tokens) | set(compact_tokens)):
+            print(f"{iteration:>9} {full_tokens.get(iteration, 0):>8} {compact_tokens.get(iteration, 0):>8}")
+        print(f"{'total':>9} {sum(full_tokens.values()):>8} {sum(compact_tokens.values()):>8}")
+        print(f"{'seconds':>9} {full_duration:>8.1f} {compact_duration:>8.1f}", end="\n\n")
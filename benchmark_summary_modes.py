@@ -0,0 +1,30 @@
+# Compares the latency of summary and title generation for the title modes of YouTubeSummarizer.
+# The response cache is disabled, the transcripts are fetched before measuring.
+# Usage: python benchmark_summary_modes.py [video_id ...]
+
+import statistics
+import sys
+import time
+
+from youtube_summarizer import YouTubeSummarizer
+
+VIDEO_IDS = sys.argv[1:] or ["5ZWeCKY5WZE"]
+MODES = ["serial", "parallel", "combined"]
+REPEATS = 3
+
+
+def measure(video_id: str, mode: str) -> float:
+    summarizer = YouTubeSummarizer(video_id)
+    summarizer.use_response_cache = False
+    summarizer.title_mode = mode
+    summarizer.fetch_transcript()
+    start = time.perf_counter()
+    summarizer.summarize_and_title()
+    return time.perf_counter() - start
+
+
+if __name__ == "__main__":
+    for mode in MODES:
+        durations = [measure(video_id, mode) for video_id in VIDEO_IDS for _ in range(REPEATS)]
+        print(f"{mode:>8}: median {statistics.median(durations):6.2f}s, "
+              f"min {min(durations):6.2f}s, max {max(durations):6.2f}s")
@@ -0,0 +1,76 @@
+import re
+from difflib import SequenceMatcher
+from typing import AsyncGenerator
+
+from google.adk.agents import BaseAgent
+from google.adk.agents.invocation_context import InvocationContext
+from google.adk.events import Event, EventActions
+
+STATE_CONVERGENCE = "convergence"
+
+
+def text_similarity(a: str, b: str) -> float:
+    """
+    Returns the similarity of two texts between 0.0 and 1.0, based on the edit distance of their words.
+    Case, whitespace and punctuation are ignored. Similarities below 0.5 are only estimated.
+    """
+    a_words, b_words = re.findall(r"\w+", str(a).lower()), re.findall(r"\w+", str(b).lower())
+    if a_words == b_words:
+        return 1.0
+    matcher = SequenceMatcher(None, a_words, b_words, autojunk=False)
+    # quick_ratio is an upper bound of ratio and much cheaper, clearly different texts don't need the full comparison.
+    upper_bound = matcher.quick_ratio()
+    if upper_bound < 0.5:
+        return upper_bound
+    return matcher.ratio()
+
+
+class ConvergenceAgent(BaseAgent):
+    """
+    Last agent of the rounds of a LoopAgent: stops the loop when it has converged, so that no model calls
+    are spent on rounds that don't change the result anymore.
+
+    A round has converged if every value of the state keys is at least similarity_threshold similar
+    to its value of the previous round, or if the critique in critique_key is at least critique_threshold
+    similar to the previous critique, i.e. the critic repeats itself. The loop stops after patience
+    converged rounds in a row, or at once if the critique is one of the stop_words.
+    The values of the previous round are kept in the state key memory_key, the similarity is computed locally.
+    """
+
+    state_keys: list[str]
+    critique_key: str | None = None
+    stop_words: list[str] = []
+    similarity_threshold: float = 0.95
+    critique_threshold: float = 0.9
+    patience: int = 1
+    memory_key: str = STATE_CONVERGENCE
+
+    async def _run_async_impl(self, ctx: InvocationContext) -> AsyncGenerator[Event, None]:
+        state = ctx.session.state
+        memory = state.get(self.memory_key) or {}
+        previous = memory.get("previous", {})
+        keys = self.state_keys + ([self.critique_key] if self.critique_key else [])
+        current = {key: str(state.get(key, "")) for key in keys}
+
+        critique = current.get(self.critique_key, "").strip()
+        stopped = self.critique_key is not None and critique in self.stop_words
+
+        similarity = None
+        if previous and all(previous.get(key) for key in self.state_keys):
+            similarity = min(text_similarity(previous[key], current[key]) for key in self.state_keys)
+        critique_similarity = None
+        if self.critique_key and previous.get(self.critique_key) and critique:
+            critique_similarity = text_similarity(previous[self.critique_key], critique)
+
+        converged = ((similarity is not None and similarity >= self.similarity_threshold)
+                     or (critique_similarity is not None and critique_similarity >= self.critique_threshold))
+        streak = memory.get("streak", 0) + 1 if converged else 0
+        yield Event(author=self.name, invocation_id=ctx.invocation_id, actions=EventActions(
+            escalate=stopped or streak >= self.patience,
+            state_delta={self.memory_key: {
+                "previous": current,
+                "streak": streak,
+                "similarity": similarity,
+                "critique_similarity": critique_similarity,
+            }},
+        ))
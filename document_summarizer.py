@@ -0,0 +1,92 @@
+import itertools
+import sys
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from extract_text import iter_pages, iter_pages_parallel
+from text_chunks import iter_chunks
+from youtube_summarizer import YouTubeSummarizer
+
+
+class DocumentSummarizer(YouTubeSummarizer):
+    """
+    Summarizes PDF documents with the prompts, language handling and response cache of YouTubeSummarizer.
+
+    The pages are extracted as a stream and summarized chunk by chunk while later pages are still being extracted.
+    At most max_pending_chunks chunks wait for or are in summarization, then the extraction pauses,
+    so that even large documents are summarized in bounded memory.
+    """
+    source_description = "documents"
+    max_pending_chunks = 8
+
+    def __init__(self, pdf_path: str, language: str = "en", parallel_extraction: bool = False,
+                 use_text_cache: bool = False):
+        """
+        :param pdf_path: path to the PDF file
+        :param language: language of the summary, one of the keys of prompts
+        :param parallel_extraction: whether to extract the pages in a process pool, see iter_pages_parallel
+        :param use_text_cache: whether to read the page texts from the PdfTextCache, that reads them all at once
+        """
+        super().__init__(video_id=None)
+        self.pdf_path = pdf_path
+        self.language = language
+        self.parallel_extraction = parallel_extraction
+        self.use_text_cache = use_text_cache
+
+    def iter_page_texts(self):
+        if self.use_text_cache:
+            from pdf_text_cache import PdfTextCache
+            yield from PdfTextCache.for_database().get_pages(self.pdf_path)
+            return
+        pages = iter_pages_parallel(self.pdf_path) if self.parallel_extraction else iter_pages(self.pdf_path)
+        for _, page_text in pages:
+            yield page_text
+
+    def summarize_chunk_stream(self, chunks) -> list[str]:
+        """
+        Summarizes the chunks concurrently as they arrive and returns the partial summaries in order.
+        Taking the next chunk blocks while max_pending_chunks chunks are not summarized yet.
+        """
+        slots = threading.BoundedSemaphore(self.max_pending_chunks)
+        futures = []
+        with ThreadPoolExecutor(max_workers=self.max_parallel_chunks) as executor:
+            for chunk in chunks:
+                slots.acquire()
+                future = executor.submit(self.summarize_text, chunk, "chunk")
+                future.add_done_callback(lambda _: slots.release())
+                futures.append(future)
+            return [future.result() for future in futures]
+
+    def condense_document(self) -> str:
+        """
+        Returns the text of the document if it fits into one request,
+        otherwise the combined summaries of its chunks.
+        """
+        chunks = iter_chunks(self.iter_page_texts(), self.max_transcript_length, self.chunk_overlap)
+        first = next(chunks, None)
+        if first is None:
+            raise Exception("no text found")
+        second = next(chunks, None)
+        if second is None:
+            return first
+        partials = self.summarize_chunk_stream(itertools.chain([first, second], chunks))
+        while sum(len(partial) + 2 for partial in partials) > self.max_transcript_length:
+            partials = self.summarize_chunks(self.group_partials(partials))
+        return "\n\n".join(partials)
+
+    def fetch_transcript(self):
+        # The condensed document takes the place of the transcript, it fits into one request.
+        self.transcript_text = self.condense_document()
+
+    def write_final_summary(self):
+        full_summary = f"# Summarizing documents\n\nfile: {self.pdf_path}\n\n## Title\n\n{self.title_text}\n\n## Summary\n\n{self.summary_text}"
+
+        output_path = f"{self.target_dir}/final-summary.md"
+        with open(output_path, "w") as final_summary_file:
+            final_summary_file.write(full_summary)
+
+
+if __name__ == "__main__":
+    # Example usage: python document_summarizer.py document.pdf [language]
+    summarizer = DocumentSummarizer(sys.argv[1], *sys.argv[2:3])
+    print(summarizer.jsonSummary())
@@ -1,30 +1,132 @@
+import mmap
+import os
+import sys
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+
 import PyPDF2
 
-def extract_text_from_pdf(pdf_path):
+
+def open_pdf(file) -> PyPDF2.PdfReader:
+    """
+    Returns a reader of the open PDF file that reads through a memory map,
+    so that the pages are loaded by the operating system on demand.
+    """
+    return PyPDF2.PdfReader(mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ))
+
+
+def count_pages(pdf_path) -> int:
+    with open(pdf_path, 'rb') as file:
+        return len(open_pdf(file).pages)
+
+
+def extract_page_range(pdf_path, start: int, stop: int) -> list[str]:
+    """
+    Extracts the text of the pages from start (inclusive) to stop (exclusive), counted from 0.
+    Runs in the worker processes of iter_pages_parallel.
+    """
+    with open(pdf_path, 'rb') as file:
+        reader = open_pdf(file)
+        return [reader.pages[page_num].extract_text() or "" for page_num in range(start, stop)]
+
+
+def iter_pages(pdf_path):
+    """
+    Extracts the text of a PDF file page by page.
+
+    Args:
+        pdf_path (str): Path to the PDF file.
+
+    Yields:
+        tuple[int, str]: The page number counted from 1 and the text of the page, empty if it has no text.
+    """
+    with open(pdf_path, 'rb') as file:
+        reader = open_pdf(file)
+        for page_num, page in enumerate(reader.pages):
+            yield page_num + 1, page.extract_text() or ""
+
+
+def iter_pages_parallel(pdf_path, workers: int = None, pages_per_task: int = 16):
+    """
+    Like iter_pages but extracts ranges of pages in parallel worker processes.
+    The pages are still yielded in order and at most two ranges per worker are extracted ahead.
+
+    Args:
+        pdf_path (str): Path to the PDF file.
+        workers (int): Number of processes, defaults to the number of CPUs.
+        pages_per_task (int): Number of pages extracted by a process at once.
+
+    Yields:
+        tuple[int, str]: The page number counted from 1 and the text of the page, empty if it has no text.
+    """
+    workers = workers or os.cpu_count() or 1
+    page_count = count_pages(pdf_path)
+    ranges = deque((start, min(start + pages_per_task, page_count)) for start in range(0, page_count, pages_per_task))
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        pending = deque()
+        while ranges or pending:
+            while ranges and len(pending) < 2 * workers:
+                start, stop = ranges.popleft()
+                pending.append((start, executor.submit(extract_page_range, pdf_path, start, stop)))
+            start, future = pending.popleft()
+            for offset, page_text in enumerate(future.result()):
+                yield start + offset + 1, page_text
+
+
+def write_text(pdf_path, output, parallel: bool = False, **parallel_options) -> int:
+    """
+    Writes the text of a PDF file to an output stream page by page instead of collecting it in memory.
+
+    Args:
+        pdf_path (str): Path to the PDF file.
+        output: Text stream, e.g. sys.stdout or a file opened for writing.
+        parallel (bool): Whether to extract the pages in parallel processes, see iter_pages_parallel.
+
+    Returns:
+        int: Number of pages.
+    """
+    pages = iter_pages_parallel(pdf_path, **parallel_options) if parallel else iter_pages(pdf_path)
+    page_count = 0
+    for page_num, page_text in pages:
+        page_count = page_num
+        if page_text:
+            output.write(page_text)
+            output.write("\n")
+        else:
+            print(f"Warning: No text found on page {page_num}.", file=sys.stderr)
+    return page_count
+
+
+def extract_text_from_pdf(pdf_path, use_cache: bool = False):
     """
     Extracts text from a PDF file.
 
     Args:
         pdf_path (str): Path to the PDF file.
+        use_cache (bool): Whether to read and store the page texts in the PdfTextCache.
 
     Returns:
         str: Extracted text.
     """
-    text = ""
+    parts = []
     try:
-        with open(pdf_path, 'rb') as file:
-            reader = PyPDF2.PdfReader(file)
-            for page_num, page in enumerate(reader.pages):
-                page_text = page.extract_text()
-                if page_text:
-                    text += page_text + "\n"
-                else:
-                    print(f"Warning: No text found on page {page_num + 1}.")
+        if use_cache:
+            # Imported here because pdf_text_cache imports this module.
+            from pdf_text_cache import PdfTextCache
+            pages = enumerate(PdfTextCache.for_database().get_pages(pdf_path), start=1)
+        else:
+            pages = iter_pages(pdf_path)
+        for page_num, page_text in pages:
+            if page_text:
+                parts.append(page_text + "\n")
+            else:
+                print(f"Warning: No text found on page {page_num}.")
     except Exception as e:
         print(f"Error reading PDF file: {e}")
-    return text
+    return "".join(parts)
+
 
-# Example usage
-pdf_path = 'SAFE_Verzeichnisdienst_V1_5.pdf'
-pdf_text = extract_text_from_pdf(pdf_path)
-print(pdf_text)
+if __name__ == '__main__':
+    # Example usage: python extract_text.py [pdf_path]
+    pdf_path = sys.argv[1] if len(sys.argv) > 1 else 'SAFE_Verzeichnisdienst_V1_5.pdf'
+    write_text(pdf_path, sys.stdout)
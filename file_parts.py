@@ -0,0 +1,98 @@
+import mimetypes
+import os
+import threading
+import time
+from datetime import datetime, timedelta, timezone
+
+from google import genai
+from google.genai import types
+
+
+class GeminiFileUploader:
+    """
+    Uploads files with the Gemini File API, uploaded files are kept for 48 hours.
+    """
+
+    poll_interval = 1.0
+    # Seconds to wait for the processing of an uploaded file.
+    processing_timeout = 600.0
+
+    def __init__(self, client: genai.Client = None):
+        self.client = client
+
+    def __call__(self, path: str, mime_type: str):
+        """
+        Uploads a file and waits until it is processed, at most processing_timeout seconds.
+
+        :return: the tuple (uri, mime type, expiration time)
+        """
+        if self.client is None:
+            self.client = genai.Client()
+        file = self.client.files.upload(file=path, config=types.UploadFileConfig(mime_type=mime_type))
+        deadline = time.monotonic() + self.processing_timeout
+        while file.state == types.FileState.PROCESSING:
+            # Videos have to be processed before they can be used in a request.
+            if time.monotonic() > deadline:
+                raise TimeoutError(f"Processing of the uploaded file {path} took longer than {self.processing_timeout}s")
+            time.sleep(self.poll_interval)
+            file = self.client.files.get(name=file.name)
+        if file.state == types.FileState.FAILED:
+            raise Exception(f"Processing of the uploaded file {path} failed: {file.error}")
+        expiration_time = file.expiration_time or datetime.now(timezone.utc) + timedelta(hours=47)
+        return file.uri, file.mime_type or mime_type, expiration_time
+
+
+class FilePartProvider:
+    """
+    Turns local files into parts of model requests.
+
+    Files up to inline_limit bytes are sent inline. Larger files are uploaded once
+    and then referenced by their URI, the handles are cached by path, modification time and size,
+    so that repeated requests on an unchanged file neither read nor upload it again.
+    """
+
+    inline_limit = 8 * 1024 * 1024
+    # Handles are renewed a bit before the uploaded file expires.
+    expiration_margin = timedelta(minutes=10)
+
+    def __init__(self, uploader=None):
+        """
+        :param uploader: a callable (path, mime type) -> (uri, mime type, expiration time),
+            defaults to the Gemini File API, a local stand-in can be used without it
+        """
+        self.uploader = uploader or GeminiFileUploader()
+        self.lock = threading.Lock()
+        self.handles = {}
+        self.key_locks = {}
+        self.uploads = 0
+        self.cache_hits = 0
+
+    def part_for(self, filename: str) -> types.Part:
+        """
+        Returns a part that contains or references the file.
+
+        :raises FileNotFoundError: if the file does not exist
+        """
+        stat = os.stat(filename)
+        mime_type = mimetypes.guess_type(filename)[0] or "application/octet-stream"
+        if stat.st_size <= self.inline_limit:
+            with open(filename, "rb") as f:
+                return types.Part.from_bytes(data=f.read(), mime_type=mime_type)
+
+        key = (os.path.abspath(filename), stat.st_mtime_ns, stat.st_size)
+        with self.lock:
+            key_lock = self.key_locks.setdefault(key, threading.Lock())
+        # Concurrent requests on the same file wait for a single upload.
+        with key_lock:
+            handle = self.handles.get(key)
+            if handle is None or handle[2] - self.expiration_margin <= datetime.now(timezone.utc):
+                handle = self.uploader(filename, mime_type)
+                with self.lock:
+                    self.uploads += 1
+                    self.handles = {k: v for k, v in self.handles.items() if k[0] != key[0]}
+                    self.handles[key] = handle
+            else:
+                with self.lock:
+                    self.cache_hits += 1
+        uri, uploaded_mime_type, _ = handle
+        return types.Part.from_uri(file_uri=uri, mime_type=uploaded_mime_type)
@@ -0,0 +1,60 @@
+from typing import AsyncGenerator
+
+from google.adk.agents import BaseAgent
+from google.adk.agents.invocation_context import InvocationContext
+from google.adk.events import Event, EventActions
+
+STATE_HISTORY_SUMMARY = "history_summary"
+STATE_HISTORY_ROUNDS = "history_rounds"
+STATE_HISTORY_ROUND_COUNT = "history_round_count"
+
+
+def state_instruction(state_keys: list[str], summary_key: str = STATE_HISTORY_SUMMARY) -> str:
+    """
+    Returns the part of an instruction that shows the latest values of the state keys and the summary
+    of the earlier rounds, for agents with include_contents='none' that don't see the conversation.
+    ADK replaces the placeholders with the state values, missing keys with an empty string.
+    """
+    lines = [f"Current value of '{key}': {{{key}?}}" for key in state_keys]
+    lines.append(f"Summary of the earlier rounds: {{{summary_key}?}}")
+    return "\n".join(lines)
+
+
+def shorten(text: str, max_length: int) -> str:
+    text = " ".join(str(text).split())
+    if len(text) <= max_length:
+        return text
+    return text[:max_length].rsplit(" ", 1)[0] + " …"
+
+
+class RollingSummaryAgent(BaseAgent):
+    """
+    Last agent of the rounds of a LoopAgent: records the values of the state keys of the round
+    in a rolling summary of at most max_rounds rounds, each value shortened to max_entry_length characters.
+
+    Together with include_contents='none' on the other agents, the size of a request stays constant
+    instead of growing with the conversation of all rounds. The summary is built without a model call.
+    """
+
+    state_keys: list[str]
+    summary_key: str = STATE_HISTORY_SUMMARY
+    rounds_key: str = STATE_HISTORY_ROUNDS
+    round_count_key: str = STATE_HISTORY_ROUND_COUNT
+    max_rounds: int = 4
+    max_entry_length: int = 160
+
+    async def _run_async_impl(self, ctx: InvocationContext) -> AsyncGenerator[Event, None]:
+        state = ctx.session.state
+        rounds = list(state.get(self.rounds_key, []))
+        entries = [f"{key}: {shorten(state[key], self.max_entry_length)}" for key in self.state_keys if state.get(key)]
+        rounds.append(" | ".join(entries))
+        rounds = rounds[-self.max_rounds:]
+        round_count = state.get(self.round_count_key, 0) + 1
+        first_round = round_count + 1 - len(rounds)
+        # The newest round is in the state in full, the summary covers the ones before.
+        summary = "\n".join(f"Round {first_round + i}: {entry}" for i, entry in enumerate(rounds[:-1]))
+        yield Event(author=self.name, invocation_id=ctx.invocation_id, actions=EventActions(state_delta={
+            self.rounds_key: rounds,
+            self.round_count_key: round_count,
+            self.summary_key: summary,
+        }))
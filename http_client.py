@@ -0,0 +1,87 @@
+import threading
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+
+class PooledHttpClient:
+    """
+    HTTP client with connection pooling, keep-alive, timeouts and retries.
+
+    One instance should live as long as the process, e.g. across warm Lambda invocations,
+    so that requests to the same host reuse TCP and TLS connections.
+    """
+
+    def __init__(self, pool_connections: int = 4, pool_maxsize: int = 16,
+                 connect_timeout: float = 10.0, read_timeout: float = 300.0,
+                 retries: int = 3, backoff_factor: float = 0.5,
+                 retry_statuses=(429, 500, 502, 503, 504)):
+        """
+        :param pool_connections: number of hosts to keep connection pools for
+        :param pool_maxsize: max. number of idle connections kept per host
+        :param connect_timeout: seconds to wait for a connection
+        :param read_timeout: seconds to wait for the server between two bytes, LLM responses can be slow
+        :param retries: max. retries of requests answered with one of retry_statuses or failing to connect,
+            read errors and timeouts are not retried
+        :param backoff_factor: retry i sleeps backoff_factor * 2 ** (i - 1) seconds unless the server sends Retry-After
+        :param retry_statuses: HTTP status codes that are retried
+        """
+        self.timeout = (connect_timeout, read_timeout)
+        retry = Retry(
+            total=retries,
+            backoff_factor=backoff_factor,
+            status_forcelist=retry_statuses,
+            # The chat completion requests are POSTs, which urllib3 does not retry by default.
+            allowed_methods=None,
+            # A POST that timed out or lost its connection after it was sent may have been processed,
+            # retrying it would repeat a slow and billed completion.
+            read=0,
+            other=0,
+            respect_retry_after_header=True,
+            raise_on_status=False,
+        )
+        self.adapter = HTTPAdapter(pool_connections=pool_connections, pool_maxsize=pool_maxsize, max_retries=retry)
+        self.session = requests.Session()
+        self.session.mount("https://", self.adapter)
+        self.session.mount("http://", self.adapter)
+        self.lock = threading.Lock()
+        self.request_count = 0
+
+    def post(self, url: str, **kwargs) -> requests.Response:
+        """
+        Same as requests.post() but uses the pooled connections and the default timeout.
+        """
+        kwargs.setdefault("timeout", self.timeout)
+        with self.lock:
+            self.request_count += 1
+        return self.session.post(url, **kwargs)
+
+    def stats(self) -> dict:
+        """
+        Returns the number of requests and how many of them reused a pooled connection.
+
+        Connection counts are only available for pools that are still open,
+        pools of hosts evicted because of pool_connections are not counted.
+        """
+        pools = self.adapter.poolmanager.pools
+        new_connections = 0
+        pool_requests = 0
+        for key in list(pools.keys()):
+            pool = pools.get(key)
+            if pool is not None:
+                new_connections += pool.num_connections
+                pool_requests += pool.num_requests
+        return {
+            "requests": self.request_count,
+            "pool_requests": pool_requests,
+            "new_connections": new_connections,
+            "reused_connections": max(pool_requests - new_connections, 0),
+        }
+
+    def close(self):
+        self.session.close()
+
+
+# Shared by all users of this module for the lifetime of the process.
+shared_client = PooledHttpClient()
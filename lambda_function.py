@@ -1,26 +1,163 @@
+import time
+
+INIT_START = time.perf_counter()
+
 import json
 import logging
 import os
-from youtube_summarizer import YouTubeSummarizer
+from youtube_summarizer import YouTubeSummarizer, summarize_many
 
 # Configure logging
 logger = logging.getLogger()
 logger.setLevel(logging.INFO)
 
+# Module level state survives warm invocations: the pooled HTTP client, the SQLite connection
+# and the imports are only initialized by the first (cold) invocation of a Lambda container.
+INIT_SECONDS = time.perf_counter() - INIT_START
+cold_start = True
+
+
+def timing_headers(timings: dict) -> dict:
+    """
+    Returns a Server-Timing header with the durations of the steps in milliseconds.
+    """
+    server_timing = ", ".join(f"{step};dur={seconds * 1000:.1f}" for step, seconds in timings.items())
+    return {'Server-Timing': server_timing}
+
+
+def summarize_batch(video_ids) -> dict:
+    """
+    Summarizes the videos concurrently and returns a dict from video ID to SummaryResult.
+    The number of parallel summaries is configured by the environment variable SUMMARY_CONCURRENCY.
+    """
+    concurrency = int(os.environ.get('SUMMARY_CONCURRENCY', '4'))
+    return {result.video_id: result for result in summarize_many(dict.fromkeys(video_ids), concurrency=concurrency)}
+
+
+def video_id_from_record(record: dict):
+    """
+    Returns the video ID of an SQS record, the body is either {"video_id": "..."} or the plain video ID.
+    Returns None if the body contains no video ID or one that is not a string.
+    """
+    body = record.get('body', '').strip()
+    # Only objects are parsed, a plain video ID may look like another JSON value, e.g. a number.
+    if body.startswith('{'):
+        try:
+            body = json.loads(body)
+        except json.JSONDecodeError:
+            return None
+    if isinstance(body, dict):
+        body = body.get('video_id')
+    if not isinstance(body, str):
+        return None
+    return body.strip() or None
+
+
+def handle_records(records: list) -> dict:
+    """
+    Summarizes the videos of an SQS batch and reports the failed messages,
+    so that only those are retried when the event source mapping uses ReportBatchItemFailures.
+    The summaries end up in the response cache of the transcript database.
+    """
+    failures = []
+    message_video_ids = {}
+    for record in records:
+        video_id = video_id_from_record(record)
+        if video_id is None:
+            logger.error(f"Missing video_id in message {record.get('messageId')}")
+            failures.append(record.get('messageId'))
+        else:
+            message_video_ids[record.get('messageId')] = video_id
+
+    results = summarize_batch(message_video_ids.values())
+    for message_id, video_id in message_video_ids.items():
+        result = results[video_id]
+        if result.error is not None:
+            logger.error(f"Error processing video ID {video_id}: {result.error}")
+            failures.append(message_id)
+        else:
+            logger.info(f"Summarized video ID {video_id}: {result.title}")
+
+    return {'batchItemFailures': [{'itemIdentifier': message_id} for message_id in failures]}
+
+
+def parse_video_ids(value):
+    """
+    Returns the video IDs of a list or a comma separated string and the items that are no strings,
+    or None if value is neither a list nor a string.
+    """
+    if isinstance(value, str):
+        value = value.split(',')
+    if not isinstance(value, list):
+        return None
+    video_ids = [item.strip() for item in value if isinstance(item, str) and item.strip()]
+    invalid_items = [item for item in value if not isinstance(item, str)]
+    return video_ids, invalid_items
+
+
+def handle_video_ids(video_ids: list, invalid_items: list = ()) -> dict:
+    """
+    Summarizes a list of videos and returns all summaries and failures, the invalid items are failures too,
+    with status code 207 if only some of them succeeded and 400 if there was no valid video ID.
+    """
+    results = summarize_batch(video_ids) if video_ids else {}
+    summaries = [
+        {'video_id': result.video_id, 'language': result.language, 'title': result.title, 'summary': result.summary}
+        for result in results.values() if result.error is None
+    ]
+    failures = [
+        {'video_id': result.video_id, 'error': str(result.error)}
+        for result in results.values() if result.error is not None
+    ] + [{'video_id': item, 'error': 'The video ID is not a string'} for item in invalid_items]
+    return {
+        'statusCode': 400 if not video_ids else 207 if failures and summaries else 500 if failures else 200,
+        'headers': {'Content-Type': 'application/json'},
+        'body': json.dumps({'summaries': summaries, 'failures': failures})
+    }
+
+
 def lambda_handler(event, context):
     """
     AWS Lambda function handler that processes a YouTube video ID and returns a summarized JSON response.
     
     Parameters:
     - event: Contains incoming data, expected to have a 'video_id' parameter
+             and optionally 'stream': true to stream the summary from the model,
+             or 'video_ids' as a list or comma separated string (also as query string parameter),
+             or SQS 'Records' whose bodies contain the video IDs
     - context: AWS Lambda context
     
     Returns:
-    - A JSON response with the video summary or an error message
+    - A JSON response with the video summary or an error message,
+      for SQS records the failed messages as batchItemFailures.
+      Errors of SQS batches are raised, so that Lambda retries all messages instead of deleting them.
     """
+    global cold_start
+    invocation_start = time.perf_counter()
+    is_cold_start = cold_start
+    cold_start = False
+    timings = {'init': INIT_SECONDS if is_cold_start else 0.0}
+
     logger.info(f"Received event: {json.dumps(event)}")
     
     try:
+        query_parameters = event.get('queryStringParameters') or {}
+        if 'Records' in event:
+            logger.info(f"Processing {len(event['Records'])} records")
+            return handle_records(event['Records'])
+        if 'video_ids' in event or 'video_ids' in query_parameters:
+            parsed = parse_video_ids(event['video_ids'] if 'video_ids' in event else query_parameters['video_ids'])
+            if parsed is None or not any(parsed):
+                logger.error("Missing or invalid video_ids parameter")
+                return {
+                    'statusCode': 400,
+                    'headers': {'Content-Type': 'application/json'},
+                    'body': json.dumps({'error': 'video_ids must be a non-empty list or comma separated string'})
+                }
+            video_ids, invalid_items = parsed
+            logger.info(f"Processing video IDs: {video_ids}")
+            return handle_video_ids(video_ids, invalid_items)
+
         # Extract video_id from the event
         if 'video_id' in event:
             video_id = event['video_id']
@@ -38,24 +175,44 @@ def lambda_handler(event, context):
         logger.info(f"Processing video ID: {video_id}")
         
         # Log environment information for debugging
-        logger.info(f"Lambda temp directory contents: {os.listdir('/tmp')}")
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug(f"Lambda temp directory contents: {os.listdir('/tmp')}")
         
         # Initialize the summarizer and get the JSON summary
         summarizer = YouTubeSummarizer(video_id)
-        summary_json = summarizer.jsonSummary()
+        if event.get('stream'):
+            # The Python runtime cannot stream the response itself, but the summary file
+            # in TARGET_DIRECTORY is written while the tokens arrive.
+            start = time.perf_counter()
+            first_token_seconds = None
+            for _ in summarizer.summarize_stream():
+                if first_token_seconds is None:
+                    first_token_seconds = time.perf_counter() - start
+                    logger.info(f"First summary token after {first_token_seconds:.3f}s")
+            summary_json = json.dumps({
+                "language": summarizer.language,
+                "title": summarizer.title_text,
+                "summary": summarizer.summary_text
+            })
+        else:
+            summary_json = summarizer.jsonSummary()
         
-        logger.info("Successfully generated summary")
+        timings.update(summarizer.timings)
+        timings['total'] = time.perf_counter() - invocation_start
+        logger.info(f"Successfully generated summary, timings: {json.dumps({'cold_start': is_cold_start, **timings})}")
         
         # Return the summary as the Lambda response
         return {
             'statusCode': 200,
-            'headers': {'Content-Type': 'application/json'},
+            'headers': {'Content-Type': 'application/json', **timing_headers(timings)},
             'body': summary_json
         }
     
     except Exception as e:
         logger.error(f"Error processing request: {str(e)}", exc_info=True)
-        
+        if 'Records' in event:
+            raise
+
         # Handle errors
         return {
             'statusCode': 500,
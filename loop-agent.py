@@ -1,10 +1,13 @@
 from google.adk.agents.loop_agent import LoopAgent
 from google.adk.agents.llm_agent import LlmAgent
 from google.genai import types
-from google.adk.sessions import InMemorySessionService
 from google.adk.runners import Runner
 from dotenv import load_dotenv
 
+from convergence import ConvergenceAgent
+from history_compaction import RollingSummaryAgent, state_instruction
+from sqlite_session_service import SqliteSessionService
+
 # Load environment variables from .env file
 load_dotenv()
 
@@ -21,52 +24,82 @@ STATE_INITIAL_TOPIC = "the super human coder"
 STATE_CURRENT_DOC = "current_document"
 STATE_CRITICISM = "criticism"
 
-writer_agent = LlmAgent(
-    name="WriterAgent",
-    model=GEMINI_MODEL,
-    instruction=f"""
+WRITER_INSTRUCTION = f"""
     You are a Creative Writer AI.
     Check the session state for '{STATE_CURRENT_DOC}'.
     If '{STATE_CURRENT_DOC}' does NOT exist or is empty, write a very short (1-2 sentence) story or document based on the topic in state key '{STATE_INITIAL_TOPIC}'.
     If '{STATE_CURRENT_DOC}' *already exists* and '{STATE_CRITICISM}', refine '{STATE_CURRENT_DOC}' according to the comments in '{STATE_CRITICISM}'."
     Output *only* the story or the exact pass-through message.
-    """,
-    description="Writes the initial document draft.",
-    output_key=STATE_CURRENT_DOC # Saves output to state
-)
-
-# Critic Agent (LlmAgent)
-critic_agent = LlmAgent(
-    name="CriticAgent",
-    model=GEMINI_MODEL,
-    instruction=f"""
+    """
+
+CRITIC_INSTRUCTION = f"""
     You are a Constructive Critic AI.
     Review the document provided in the session state key '{STATE_CURRENT_DOC}'.
     Provide 1-2 brief suggestions for improvement (e.g., "Make it more exciting", "Add more detail").
     Output *only* the critique.
-    """,
-    description="Reviews the current document draft.",
-    output_key=STATE_CRITICISM # Saves critique to state
-)
+    """
+
+
+def create_loop_agent(compact_history: bool = True, stop_on_convergence: bool = True) -> LoopAgent:
+    """
+    With compact_history the agents don't get the conversation of all rounds,
+    only the latest document and criticism and a short summary of the earlier rounds.
+    With stop_on_convergence the loop stops before max_iterations once the document hardly changes anymore
+    or the critic repeats its criticism.
+    """
+    state_keys = [STATE_CURRENT_DOC, STATE_CRITICISM]
+    extra_instruction = state_instruction(state_keys) if compact_history else ""
+    include_contents = 'none' if compact_history else 'default'
+
+    writer_agent = LlmAgent(
+        name="WriterAgent",
+        model=GEMINI_MODEL,
+        instruction=WRITER_INSTRUCTION + extra_instruction,
+        description="Writes the initial document draft.",
+        include_contents=include_contents,
+        output_key=STATE_CURRENT_DOC # Saves output to state
+    )
 
-# Create the LoopAgent
-loop_agent = LoopAgent(
-    name="LoopAgent", sub_agents=[writer_agent, critic_agent], max_iterations=10
-)
+    # Critic Agent (LlmAgent)
+    critic_agent = LlmAgent(
+        name="CriticAgent",
+        model=GEMINI_MODEL,
+        instruction=CRITIC_INSTRUCTION + extra_instruction,
+        description="Reviews the current document draft.",
+        include_contents=include_contents,
+        output_key=STATE_CRITICISM # Saves critique to state
+    )
+
+    sub_agents = [writer_agent, critic_agent]
+    if compact_history:
+        sub_agents.append(RollingSummaryAgent(name="RollingSummary", state_keys=state_keys))
+    if stop_on_convergence:
+        sub_agents.append(ConvergenceAgent(name="Convergence", state_keys=[STATE_CURRENT_DOC],
+                                           critique_key=STATE_CRITICISM))
+
+    # Create the LoopAgent
+    return LoopAgent(
+        name="LoopAgent", sub_agents=sub_agents, max_iterations=10
+    )
 
-# Session and Runner
-session_service = InMemorySessionService()
-session = session_service.create_session(app_name=APP_NAME, user_id=USER_ID, session_id=SESSION_ID)
-runner = Runner(agent=loop_agent, app_name=APP_NAME, session_service=session_service)
 
 # Agent Interaction
-def call_agent(query):
+def call_agent(runner, query):
     content = types.Content(role='user', parts=[types.Part(text=query)])
     events = runner.run(user_id=USER_ID, session_id=SESSION_ID, new_message=content)
 
     for event in events:
-        if event.is_final_response():
+        if event.content is not None and event.is_final_response():
             final_response = event.content.parts[0].text
             print("Agent Response: ", final_response)
 
-call_agent("execute")
+
+if __name__ == "__main__":
+    # Session and Runner
+    session_service = SqliteSessionService.for_database()
+    # Every run starts a new session, the last one stays in the database for inspection.
+    session_service.delete_session(app_name=APP_NAME, user_id=USER_ID, session_id=SESSION_ID)
+    session = session_service.create_session(app_name=APP_NAME, user_id=USER_ID, session_id=SESSION_ID)
+    runner = Runner(agent=create_loop_agent(), app_name=APP_NAME, session_service=session_service)
+
+    call_agent(runner, "execute")
@@ -1,44 +1,57 @@
 import asyncio
+import os
 
 from dotenv import load_dotenv
 from google.adk.agents.llm_agent import LlmAgent
 from google.adk.artifacts.in_memory_artifact_service import InMemoryArtifactService  # Optional
 from google.adk.runners import Runner
-from google.adk.sessions import InMemorySessionService
-from google.adk.tools.mcp_tool.mcp_toolset import MCPToolset, StdioServerParameters
+from google.adk.tools.mcp_tool.mcp_toolset import StdioServerParameters
 from google.genai import types
 
+from mcp_broker import brokered
+from mcp_connections import McpConnectionManager
+from mcp_tool_cache import McpToolCache
+from sqlite_session_service import SqliteSessionService
+
 load_dotenv()
 
 
+# The servers are started together and kept running for all sessions of this process.
+# The server processes are shared with other agents on this host through the MCP broker.
+mcp_servers = McpConnectionManager()
+mcp_servers.add("filesystem", brokered(StdioServerParameters(
+    command='npx',
+    args=["-y",
+          # "@modelcontextprotocol/server-filesystem",
+          "danielsuguimoto/readonly-filesystem-mcp",
+          # The broker starts the server in its own working directory.
+          os.path.abspath(".")],
+)))
+mcp_servers.add("jetbrains", brokered(StdioServerParameters(
+    command='npx',
+    args=["-y",
+          "@jetbrains/mcp-proxy"],
+)))
+
+# The filesystem server is read-only, its results are reused while the files are unchanged.
+filesystem_cache = McpToolCache()
+
+
 async def get_filesystem_tools_async():
     """Gets tools from the File System MCP Server."""
-    return await MCPToolset.from_server(
-        connection_params=StdioServerParameters(
-            command='npx',
-            args=["-y",
-                  # "@modelcontextprotocol/server-filesystem",
-                  "danielsuguimoto/readonly-filesystem-mcp",
-                  "."],
-        )
-    )
+    return filesystem_cache.wrap((await mcp_servers.start("filesystem"))["filesystem"], read_only=True)
 
 
 async def get_jetbrains_tools_async():
     """Gets tools from the Jetbrains MCP Server."""
-    return await MCPToolset.from_server(
-        connection_params=StdioServerParameters(
-            command='npx',
-            args=["-y",
-                  "@jetbrains/mcp-proxy"],
-        )
-    )
+    return (await mcp_servers.start("jetbrains"))["jetbrains"]
 
 
 async def get_agent_async():
     """Creates an ADK Agent equipped with tools from the MCP Server."""
-    tools_filesystem, exit_stack_filesystem = await get_filesystem_tools_async()
-    tools_jetbrains, exit_stack_jetbrains = await get_jetbrains_tools_async()
+    # Both servers start at the same time, so the startup takes as long as the slower one.
+    tools_filesystem, tools_jetbrains = await asyncio.gather(get_filesystem_tools_async(),
+                                                             get_jetbrains_tools_async())
     root_agent = LlmAgent(
         # model='gemini-2.0-flash',
         model='gemini-2.5-flash-preview-04-17',
@@ -48,7 +61,7 @@ async def get_agent_async():
         # tools=tools_jetbrains,
         tools=tools_filesystem,
     )
-    return root_agent, exit_stack_filesystem, exit_stack_jetbrains
+    return root_agent
 
 
 async def run_agent(runner, session):
@@ -82,7 +95,7 @@ async def run_agent(runner, session):
 
 
 async def async_main():
-    session_service = InMemorySessionService()
+    session_service = SqliteSessionService.for_database()
     # Artifact service might not be needed for this example
     artifacts_service = InMemoryArtifactService()
 
@@ -90,7 +103,7 @@ async def async_main():
         state={}, app_name='mcp_filesystem_app', user_id='user_fs'
     )
 
-    root_agent, exit_stack_filesystem, exit_stack_jetbrains = await get_agent_async()
+    root_agent = await get_agent_async()
 
     runner = Runner(
         app_name='mcp_filesystem_app',
@@ -99,11 +112,13 @@ async def async_main():
         session_service=session_service,
     )
 
-    await run_agent(runner, session)
-
-    # Crucial Cleanup: Ensure the MCP server process connection is closed.
-    await exit_stack_filesystem.aclose()
-    await exit_stack_jetbrains.aclose()
+    try:
+        await run_agent(runner, session)
+    finally:
+        # Crucial Cleanup: Ensure the MCP server processes are stopped.
+        await mcp_servers.close()
+        for tool_name, stats in filesystem_cache.stats().items():
+            print(f"cache: {tool_name} {stats['hits']} hits, {stats['misses']} misses, hit rate {stats['hit_rate']:.0%}")
 
 
 if __name__ == '__main__':
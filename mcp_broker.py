@@ -0,0 +1,503 @@
+# Shares MCP server processes between the agents of a host.
+#
+# The broker is a local daemon that listens on a Unix socket and keeps one warm server process per
+# (command, args, env). Agents start the shim `python mcp_broker.py connect -- <command> <args>` as their
+# MCP server, it forwards stdin and stdout to the broker, which multiplexes the sessions of all agents
+# over the one server process by rewriting the JSON-RPC request IDs.
+#
+# The broker is started by the first shim that can't connect to it. Servers without sessions are stopped
+# after an idle timeout, at most max_processes servers run at the same time. The broker exits when it had
+# no servers for another idle timeout, the next shim starts it again.
+#
+# Usage:
+#     python mcp_broker.py serve [--max-processes N] [--idle-timeout SECONDS]
+#     python mcp_broker.py stats
+#     python mcp_broker.py connect [--env NAME ...] -- <command> [args ...]
+
+import argparse
+import asyncio
+import itertools
+import json
+import logging
+import os
+import subprocess
+import sys
+import time
+
+# MCP messages are single lines, file contents can make them long.
+LINE_LIMIT = 64 * 1024 * 1024
+# Below the ping timeout of McpConnection, so that a hung server is killed before the client gives up.
+PING_TIMEOUT = 5.0
+# The environment of the shim, the broker and the servers, besides the variables a server is started with.
+BASE_ENV_NAMES = ("HOME", "LANG", "LC_ALL", "LOGNAME", "MCP_BROKER_SOCKET", "PATH", "SHELL", "TMPDIR", "USER")
+
+
+def socket_path() -> str:
+    return os.environ.get("MCP_BROKER_SOCKET", os.path.expanduser("~/.cache/mcp-broker.sock"))
+
+
+def base_environment() -> dict:
+    return {name: os.environ[name] for name in BASE_ENV_NAMES if name in os.environ}
+
+
+def brokered(connection_params):
+    """
+    Returns parameters that connect to the server through the broker instead of starting it,
+    unless the environment variable MCP_BROKER is 0.
+    The values of the environment variables of the server are passed to the broker, not on the command line.
+    Other variables of the agent, e.g. its API keys, are not passed on.
+    """
+    # Imported here, so that the shim starts without loading the MCP client.
+    from mcp import StdioServerParameters
+
+    if os.environ.get("MCP_BROKER", "1") == "0":
+        return connection_params
+    env = connection_params.env or {}
+    env_args = [arg for name in sorted(env) for arg in ("--env", name)]
+    return StdioServerParameters(
+        command=sys.executable,
+        args=[os.path.abspath(__file__), "connect", *env_args, "--", connection_params.command,
+              *connection_params.args],
+        env={**base_environment(), **env},
+    )
+
+
+def encode(message: dict) -> bytes:
+    return json.dumps(message, separators=(",", ":")).encode("utf-8") + b"\n"
+
+
+def error_response(request_id, message: str, code: int = -32000) -> dict:
+    return {"jsonrpc": "2.0", "id": request_id, "error": {"code": code, "message": message}}
+
+
+class PoolFullError(Exception):
+    pass
+
+
+class ClientSession:
+    """
+    The connection of one shim, i.e. one MCP session of an agent.
+    """
+
+    def __init__(self, writer: asyncio.StreamWriter):
+        self.writer = writer
+        # Own request IDs by the broker's IDs of the pending requests.
+        self.pending = {}
+        self.tasks = set()
+
+    def send(self, message: dict):
+        if not self.writer.is_closing():
+            self.writer.write(encode(message))
+
+
+class ServerProcess:
+    """
+    A running MCP server and the sessions that share it.
+    """
+
+    def __init__(self, key: tuple, command: str, args: list[str], env: dict):
+        self.key = key
+        self.command = command
+        self.args = args
+        self.env = env
+        self.process: asyncio.subprocess.Process = None
+        self.clients: set[ClientSession] = set()
+        # Callers of the broker's IDs, a future for the broker's own requests.
+        self.routes = {}
+        self.ids = itertools.count(1)
+        self.initialize_result = None
+        self.initialize_lock = asyncio.Lock()
+        self.reader_task: asyncio.Task = None
+        self.started = time.time()
+        self.last_used = time.monotonic()
+        self.requests = 0
+
+    async def start(self):
+        self.process = await asyncio.create_subprocess_exec(
+            self.command, *self.args, env={**base_environment(), **self.env},
+            stdin=subprocess.PIPE, stdout=subprocess.PIPE, limit=LINE_LIMIT)
+        self.reader_task = asyncio.create_task(self.read_loop())
+
+    @property
+    def alive(self) -> bool:
+        return self.process is not None and self.process.returncode is None and not self.reader_task.done()
+
+    def write(self, message: dict):
+        self.process.stdin.write(encode(message))
+
+    def forward(self, client: ClientSession, message: dict):
+        """
+        Sends a request of a client to the server under an ID of the broker.
+        """
+        broker_id = next(self.ids)
+        self.routes[broker_id] = (client, message["id"])
+        client.pending[message["id"]] = broker_id
+        self.requests += 1
+        self.write({**message, "id": broker_id})
+
+    async def request(self, method: str, params: dict, timeout: float = None) -> dict:
+        broker_id = next(self.ids)
+        future = asyncio.get_running_loop().create_future()
+        self.routes[broker_id] = future
+        self.write({"jsonrpc": "2.0", "id": broker_id, "method": method, "params": params})
+        try:
+            return await asyncio.wait_for(future, timeout)
+        finally:
+            self.routes.pop(broker_id, None)
+
+    async def ping(self, client: ClientSession, request_id):
+        """
+        Answers a ping of a client with the ping of the server. A server that doesn't answer in time is killed,
+        this closes its sessions and the next session starts a new server.
+        """
+        try:
+            response = await self.request("ping", {}, PING_TIMEOUT)
+        except asyncio.TimeoutError:
+            logging.warning("%s didn't answer a ping within %ss, killing it.", self.command, PING_TIMEOUT)
+            client.send(error_response(request_id, "The MCP server is not responding"))
+            self.process.kill()
+            return
+        client.send({**response, "id": request_id})
+
+    async def initialize(self, params: dict) -> dict:
+        """
+        Initializes the server for the first session, the result is reused for the later ones.
+        """
+        async with self.initialize_lock:
+            if self.initialize_result is None:
+                response = await self.request("initialize", params)
+                if "error" in response:
+                    raise Exception(response["error"].get("message"))
+                self.write({"jsonrpc": "2.0", "method": "notifications/initialized"})
+                self.initialize_result = response["result"]
+        return self.initialize_result
+
+    async def read_loop(self):
+        try:
+            while line := await self.process.stdout.readline():
+                try:
+                    message = json.loads(line)
+                except ValueError:
+                    logging.warning("Invalid message from %s: %r", self.command, line[:200])
+                    continue
+                if "id" in message and ("result" in message or "error" in message):
+                    route = self.routes.pop(message["id"], None)
+                    if isinstance(route, asyncio.Future):
+                        route.set_result(message)
+                    elif route is not None:
+                        client, client_id = route
+                        client.pending.pop(client_id, None)
+                        client.send({**message, "id": client_id})
+                elif "id" in message:
+                    # Requests of the server can't be assigned to a session, only pings are answered.
+                    if message.get("method") == "ping":
+                        self.write({"jsonrpc": "2.0", "id": message["id"], "result": {}})
+                    else:
+                        self.write(error_response(message["id"], "Not supported by the MCP broker", -32601))
+                else:
+                    for client in self.clients:
+                        client.send(message)
+        finally:
+            # The pending requests fail and the sessions are closed, so that their clients reconnect.
+            for broker_id, route in self.routes.items():
+                if isinstance(route, asyncio.Future):
+                    if not route.done():
+                        route.set_result(error_response(broker_id, "Connection closed"))
+                else:
+                    client, client_id = route
+                    client.send(error_response(client_id, "Connection closed"))
+            self.routes.clear()
+            for client in self.clients:
+                client.writer.close()
+
+    async def stop(self):
+        if self.process.returncode is None:
+            self.process.stdin.close()
+            try:
+                await asyncio.wait_for(self.process.wait(), 5)
+            except asyncio.TimeoutError:
+                self.process.kill()
+                await self.process.wait()
+        await asyncio.gather(self.reader_task, return_exceptions=True)
+
+    def stats(self) -> dict:
+        return {"command": self.command, "args": self.args, "env": sorted(self.env),
+                "pid": self.process.pid, "alive": self.alive, "sessions": len(self.clients),
+                "requests": self.requests, "pending": len(self.routes),
+                "uptime_seconds": round(time.time() - self.started, 1),
+                "idle_seconds": round(time.monotonic() - self.last_used, 1) if not self.clients else 0}
+
+
+class ServerPool:
+    """
+    The server processes by (command, args, env).
+    """
+
+    def __init__(self, max_processes: int = 8, idle_timeout: float = 600.0):
+        self.max_processes = max_processes
+        self.idle_timeout = idle_timeout
+        self.servers: dict[tuple, ServerProcess] = {}
+        self.lock = asyncio.Lock()
+        # Connections of shims, including those that only ask for the stats.
+        self.connections = 0
+        self.counters = {"spawned": 0, "reused": 0, "idle_stopped": 0, "evicted": 0, "rejected": 0, "crashed": 0}
+
+    async def acquire(self, command: str, args: list[str], env: dict) -> ServerProcess:
+        key = (command, tuple(args), tuple(sorted(env.items())))
+        async with self.lock:
+            server = self.servers.get(key)
+            if server is not None and not server.alive:
+                self.counters["crashed"] += 1
+                await self.remove(server)
+                server = None
+            if server is not None:
+                self.counters["reused"] += 1
+                return server
+            if len(self.servers) >= self.max_processes:
+                idle = [server for server in self.servers.values() if not server.clients]
+                if not idle:
+                    self.counters["rejected"] += 1
+                    raise PoolFullError(f"All {self.max_processes} MCP server processes are in use.")
+                self.counters["evicted"] += 1
+                await self.remove(min(idle, key=lambda server: server.last_used))
+            server = ServerProcess(key, command, args, env)
+            await server.start()
+            self.servers[key] = server
+            self.counters["spawned"] += 1
+            return server
+
+    async def remove(self, server: ServerProcess):
+        if self.servers.get(server.key) is server:
+            del self.servers[server.key]
+        await server.stop()
+
+    async def reap(self):
+        """
+        Stops the servers that had no sessions for idle_timeout seconds and removes crashed ones.
+        Returns when there were no servers for idle_timeout seconds.
+        """
+        empty_since = time.monotonic()
+        while True:
+            await asyncio.sleep(max(1.0, min(self.idle_timeout / 4, 60.0)))
+            async with self.lock:
+                now = time.monotonic()
+                if self.servers or self.connections:
+                    empty_since = now
+                elif now - empty_since > self.idle_timeout:
+                    return
+                for server in list(self.servers.values()):
+                    if not server.alive:
+                        self.counters["crashed"] += 1
+                        await self.remove(server)
+                    elif not server.clients and now - server.last_used > self.idle_timeout:
+                        self.counters["idle_stopped"] += 1
+                        await self.remove(server)
+
+    async def close(self):
+        async with self.lock:
+            for server in list(self.servers.values()):
+                await self.remove(server)
+
+    def stats(self) -> dict:
+        return {"max_processes": self.max_processes, "idle_timeout": self.idle_timeout,
+                "processes": len(self.servers),
+                "sessions": sum(len(server.clients) for server in self.servers.values()),
+                **self.counters,
+                "servers": [server.stats() for server in self.servers.values()]}
+
+
+async def handle_client(pool: ServerPool, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+    """
+    Serves one shim: a hello line that names the server, then the MCP messages of one session.
+    """
+    client = ClientSession(writer)
+    server = None
+    pool.connections += 1
+    try:
+        hello = json.loads(await reader.readline() or b"{}")
+        if hello.get("stats"):
+            client.send(pool.stats())
+            return
+        try:
+            server = await pool.acquire(hello["command"], hello.get("args", []), hello.get("env", {}))
+        except Exception as e:
+            client.send({"error": str(e)})
+            return
+        server.clients.add(client)
+        client.send({"ok": True})
+
+        while line := await reader.readline():
+            message = json.loads(line)
+            method = message.get("method")
+            if method == "initialize":
+                try:
+                    client.send({"jsonrpc": "2.0", "id": message["id"],
+                                 "result": await server.initialize(message.get("params", {}))})
+                except Exception as e:
+                    client.send(error_response(message["id"], f"Initialization failed: {e}"))
+            elif method == "notifications/initialized":
+                pass
+            elif not server.alive:
+                break
+            elif method == "ping":
+                task = asyncio.create_task(server.ping(client, message["id"]))
+                client.tasks.add(task)
+                task.add_done_callback(client.tasks.discard)
+            elif "id" in message and method:
+                server.forward(client, message)
+            elif method == "notifications/cancelled":
+                broker_id = client.pending.get(message.get("params", {}).get("requestId"))
+                if broker_id is not None:
+                    server.write({**message, "params": {**message["params"], "requestId": broker_id}})
+            elif method:
+                server.write(message)
+            await writer.drain()
+            await server.process.stdin.drain()
+    except (ConnectionError, ValueError) as e:
+        logging.info("Session closed: %r", e)
+    finally:
+        if server is not None:
+            server.clients.discard(client)
+            for broker_id in client.pending.values():
+                server.routes.pop(broker_id, None)
+            server.last_used = time.monotonic()
+        pool.connections -= 1
+        writer.close()
+
+
+async def serve(max_processes: int, idle_timeout: float):
+    # Imported here, so that the agents can import this module on systems without fcntl.
+    import fcntl
+
+    path = socket_path()
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    # Only one broker per socket, a second one exits.
+    lock_file = open(path + ".lock", "w")
+    try:
+        fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+    except BlockingIOError:
+        logging.info("Another MCP broker is running on %s.", path)
+        return
+    if os.path.exists(path):
+        os.unlink(path)
+
+    pool = ServerPool(max_processes, idle_timeout)
+    # Only the user may connect, a client can make the broker run any command.
+    umask = os.umask(0o177)
+    try:
+        unix_server = await asyncio.start_unix_server(lambda reader, writer: handle_client(pool, reader, writer),
+                                                      path, limit=LINE_LIMIT)
+    finally:
+        os.umask(umask)
+    reaper = asyncio.create_task(pool.reap())
+    logging.info("MCP broker listening on %s.", path)
+    try:
+        async with unix_server:
+            # The server accepts connections until the pool was idle for long enough.
+            await reaper
+        logging.info("MCP broker idle, exiting.")
+    finally:
+        reaper.cancel()
+        await pool.close()
+        os.unlink(path)
+
+
+async def open_broker(timeout: float = 10.0):
+    """
+    Connects to the broker, starts it in the background if it isn't running.
+    """
+    path = socket_path()
+    try:
+        return await asyncio.open_unix_connection(path, limit=LINE_LIMIT)
+    except (FileNotFoundError, ConnectionRefusedError):
+        pass
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    with open(os.path.splitext(path)[0] + ".log", "a") as log:
+        subprocess.Popen([sys.executable, os.path.abspath(__file__), "serve"], stdin=subprocess.DEVNULL,
+                         stdout=log, stderr=log, start_new_session=True)
+    deadline = time.monotonic() + timeout
+    while True:
+        try:
+            return await asyncio.open_unix_connection(path, limit=LINE_LIMIT)
+        except (FileNotFoundError, ConnectionRefusedError):
+            if time.monotonic() > deadline:
+                raise
+            await asyncio.sleep(0.1)
+
+
+async def connect(command: str, args: list[str], env_names: list[str]) -> int:
+    """
+    Forwards stdin and stdout of this process to a session of the broker.
+    """
+    reader, writer = await open_broker()
+    writer.write(encode({"command": command, "args": args,
+                         "env": {name: os.environ[name] for name in env_names if name in os.environ}}))
+    reply = json.loads(await reader.readline() or b'{"error": "no reply"}')
+    if "error" in reply:
+        print(f"MCP broker: {reply['error']}", file=sys.stderr)
+        return 1
+
+    loop = asyncio.get_running_loop()
+    stdin = asyncio.StreamReader(limit=LINE_LIMIT)
+    await loop.connect_read_pipe(lambda: asyncio.StreamReaderProtocol(stdin), sys.stdin)
+
+    async def to_broker():
+        while line := await stdin.readline():
+            writer.write(line)
+            await writer.drain()
+
+    async def from_broker():
+        while line := await reader.readline():
+            sys.stdout.buffer.write(line)
+            sys.stdout.buffer.flush()
+
+    tasks = [asyncio.create_task(to_broker()), asyncio.create_task(from_broker())]
+    # Either side closing ends the session.
+    await asyncio.wait(tasks, return_when=asyncio.FIRST_COMPLETED)
+    for task in tasks:
+        task.cancel()
+    writer.close()
+    return 0
+
+
+async def print_stats() -> int:
+    try:
+        reader, writer = await asyncio.open_unix_connection(socket_path(), limit=LINE_LIMIT)
+    except (FileNotFoundError, ConnectionRefusedError):
+        print("The MCP broker is not running.")
+        return 1
+    writer.write(encode({"stats": True}))
+    print(json.dumps(json.loads(await reader.readline()), indent=2))
+    writer.close()
+    return 0
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Shares MCP server processes between agents.")
+    commands = parser.add_subparsers(dest="command", required=True)
+    serve_parser = commands.add_parser("serve", help="run the broker in the foreground")
+    serve_parser.add_argument("--max-processes", type=int, default=8, help="max. number of server processes")
+    serve_parser.add_argument("--idle-timeout", type=float, default=600.0,
+                              help="seconds after which a server without sessions is stopped, "
+                                   "and the broker without servers exits")
+    commands.add_parser("stats", help="show the server processes and counters of the running broker")
+    connect_parser = commands.add_parser("connect", help="connect stdin and stdout to a server of the broker")
+    connect_parser.add_argument("--env", action="append", default=[],
+                                help="name of an environment variable that is passed to the server")
+    connect_parser.add_argument("server", nargs=argparse.REMAINDER, help="-- command and args of the server")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(message)s")
+    if args.command == "serve":
+        asyncio.run(serve(args.max_processes, args.idle_timeout))
+    elif args.command == "stats":
+        sys.exit(asyncio.run(print_stats()))
+    elif args.command == "connect":
+        server = args.server[1:] if args.server[:1] == ["--"] else args.server
+        if not server:
+            parser.error("the command of the server is missing")
+        sys.exit(asyncio.run(connect(server[0], server[1:], args.env)))
+
+
+if __name__ == "__main__":
+    main()
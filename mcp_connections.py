@@ -0,0 +1,202 @@
+import asyncio
+import logging
+from contextlib import AsyncExitStack
+
+from google.adk.tools.mcp_tool.mcp_session_manager import MCPSessionManager, SseServerParams
+from google.adk.tools.mcp_tool.mcp_tool import MCPTool
+from google.adk.tools.mcp_tool.mcp_toolset import StdioServerParameters
+from google.adk.tools.tool_context import ToolContext
+from mcp import ClientSession
+from mcp.types import Tool as McpBaseTool
+
+class McpConnection:
+    """
+    Keeps the connection to an MCP server open in a task of its own.
+
+    The MCP client must be closed by the task that opened it, so MCPToolset.from_server can't be
+    awaited concurrently for several servers. Here every server has its own task that opens the connection,
+    waits and closes it again, which lets the servers start at the same time.
+    A server that crashes or stops answering pings is restarted, its tools then use the new session.
+    """
+
+    health_interval = 30.0
+    ping_timeout = 10.0
+    call_timeout = 300.0
+    restart_delay = 1.0
+    # Consecutive failed starts before the server is given up.
+    max_failures = 5
+
+    def __init__(self, name: str, connection_params: StdioServerParameters | SseServerParams):
+        self.name = name
+        self.connection_params = connection_params
+        self.session: ClientSession = None
+        self.tools: list["ManagedMcpTool"] = []
+        self.error: Exception = None
+        self.starts = 0
+        self.restarts = 0
+        self.task: asyncio.Task = None
+        self.ready = asyncio.Event()
+        self.restart_requested = asyncio.Event()
+
+    async def start(self) -> list["ManagedMcpTool"]:
+        """
+        Starts the server unless it is running already and returns its tools.
+        """
+        if self.task is None or self.task.done():
+            self.error = None
+            self.task = asyncio.create_task(self.run(), name=f"mcp-{self.name}")
+        await self.get_session()
+        return self.tools
+
+    async def get_session(self) -> ClientSession:
+        """
+        Returns the current session, waits while the server is (re)started.
+        """
+        await self.ready.wait()
+        if self.session is None:
+            raise RuntimeError(f"The MCP server {self.name} is not running: {self.error}") from self.error
+        return self.session
+
+    def restart(self, session: ClientSession):
+        """
+        Restarts the server of the session, unless it was restarted already.
+        """
+        if session is self.session and self.task is not None and not self.task.done():
+            self.ready.clear()
+            self.restart_requested.set()
+
+    async def run(self):
+        failures = 0
+        while True:
+            try:
+                async with AsyncExitStack() as exit_stack:
+                    session = await MCPSessionManager.initialize_session(
+                        connection_params=self.connection_params, exit_stack=exit_stack)
+                    mcp_tools = (await session.list_tools()).tools
+                    self.session = session
+                    known_tools = {tool.name: tool for tool in self.tools}
+                    self.tools = [known_tools.get(mcp_tool.name) or ManagedMcpTool(self, mcp_tool)
+                                  for mcp_tool in mcp_tools]
+                    if self.starts:
+                        self.restarts += 1
+                    self.starts += 1
+                    failures = 0
+                    self.restart_requested.clear()
+                    self.ready.set()
+                    await self.watch(session)
+                    logging.warning("Restarting the MCP server %s.", self.name)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                failures += 1
+                self.error = e
+                logging.warning("The MCP server %s failed: %r", self.name, e)
+            finally:
+                self.session = None
+            if failures >= self.max_failures:
+                # Wakes up the waiting callers, they get the error.
+                self.ready.set()
+                return
+            self.ready.clear()
+            await asyncio.sleep(self.restart_delay)
+
+    async def watch(self, session: ClientSession):
+        """
+        Returns when a restart is requested, raises an exception when the server stops answering pings.
+        """
+        while True:
+            try:
+                await asyncio.wait_for(self.restart_requested.wait(), self.health_interval)
+                return
+            except asyncio.TimeoutError:
+                pass
+            await asyncio.wait_for(session.send_ping(), self.ping_timeout)
+
+    async def is_alive(self, session: ClientSession) -> bool:
+        try:
+            await asyncio.wait_for(session.send_ping(), self.ping_timeout)
+            return True
+        except Exception:
+            return False
+
+    async def close(self):
+        if self.task is not None:
+            self.task.cancel()
+            await asyncio.gather(self.task, return_exceptions=True)
+            self.task = None
+        self.ready.clear()
+
+    def stats(self) -> dict:
+        return {"running": self.session is not None, "tools": len(self.tools),
+                "starts": self.starts, "restarts": self.restarts,
+                "error": repr(self.error) if self.error else None}
+
+
+class ManagedMcpTool(MCPTool):
+    """
+    An MCPTool that calls the current session of its McpConnection instead of a fixed one,
+    so that it keeps working after the server was restarted.
+    """
+
+    def __init__(self, connection: McpConnection, mcp_tool: McpBaseTool):
+        super().__init__(mcp_tool=mcp_tool, mcp_session=connection.session, mcp_session_manager=None)
+        self.connection = connection
+
+    async def run_async(self, *, args, tool_context: ToolContext):
+        session = await self.connection.get_session()
+        try:
+            return await asyncio.wait_for(session.call_tool(self.name, arguments=args),
+                                          self.connection.call_timeout)
+        except Exception:
+            # The MCP client raises different errors for a lost server, a ping tells them apart from tool errors.
+            if await self.connection.is_alive(session):
+                raise
+            # Retried once on a new server, a tool that crashes its server again fails.
+            self.connection.restart(session)
+            session = await self.connection.get_session()
+            return await asyncio.wait_for(session.call_tool(self.name, arguments=args),
+                                          self.connection.call_timeout)
+
+
+class McpConnectionManager:
+    """
+    Starts MCP servers concurrently and keeps them running until it is closed,
+    so that later agents and sessions of the same process get the tools without waiting.
+
+    Usage:
+        servers = McpConnectionManager()
+        servers.add("filesystem", StdioServerParameters(command="npx", args=[...]))
+        tools = await servers.start("filesystem")
+        ...
+        await servers.close()
+    """
+
+    def __init__(self):
+        self.connections: dict[str, McpConnection] = {}
+
+    def add(self, name: str, connection_params: StdioServerParameters | SseServerParams) -> McpConnection:
+        if name not in self.connections:
+            self.connections[name] = McpConnection(name, connection_params)
+        return self.connections[name]
+
+    async def start(self, *names: str) -> dict[str, list[MCPTool]]:
+        """
+        Starts the servers, by default all of them, at the same time.
+
+        :return: the tools by server name
+        """
+        names = names or tuple(self.connections)
+        tools = await asyncio.gather(*(self.connections[name].start() for name in names))
+        return dict(zip(names, tools))
+
+    async def close(self):
+        await asyncio.gather(*(connection.close() for connection in self.connections.values()))
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, exc_type, exc_val, exc_tb):
+        await self.close()
+
+    def stats(self) -> dict:
+        return {name: connection.stats() for name, connection in self.connections.items()}
@@ -10,8 +10,24 @@ from google.adk.sessions import InMemorySessionService
 from google.adk.tools.mcp_tool.mcp_toolset import MCPToolset, StdioServerParameters
 from google.genai import types
 
+from mcp_broker import brokered
+from mcp_tool_cache import PersistentToolCache
+from sqlite_database import SqliteDatabase
+
 load_dotenv()
 
+# Places rarely move, routes depend on the traffic. Identical calls in flight are coalesced for all tools.
+MAPS_TTL_SECONDS = {
+    "maps_geocode": 30 * 24 * 3600,
+    "maps_reverse_geocode": 30 * 24 * 3600,
+    "maps_elevation": 30 * 24 * 3600,
+    "maps_place_details": 24 * 3600,
+    "maps_search_places": 24 * 3600,
+    "maps_directions": 15 * 60,
+    "maps_distance_matrix": 15 * 60,
+}
+maps_cache = PersistentToolCache(SqliteDatabase.for_path(PersistentToolCache.default_path()), MAPS_TTL_SECONDS)
+
 
 async def get_tools_async():
     """ Step 1: Gets tools from the Google Maps MCP Server."""
@@ -19,7 +35,8 @@ async def get_tools_async():
 
     print("Attempting to connect to MCP Google Maps server...")
     tools, exit_stack = await MCPToolset.from_server(
-        connection_params=StdioServerParameters(
+        # The server process is shared with other agents on this host through the MCP broker.
+        connection_params=brokered(StdioServerParameters(
             command='npx',
             args=["-y",
                   "@modelcontextprotocol/server-google-maps",
@@ -28,10 +45,10 @@ async def get_tools_async():
             env={
                 "GOOGLE_MAPS_API_KEY": google_maps_api_key
             }
-        )
+        ))
     )
     print("MCP Toolset created successfully.")
-    return tools, exit_stack
+    return maps_cache.wrap(tools), exit_stack
 
 
 # --- Step 2: Agent Definition ---
@@ -97,6 +114,8 @@ async def async_main():
     print("Closing MCP server connection...")
     await exit_stack.aclose()
     print("Cleanup complete.")
+    for tool_name, stats in maps_cache.stats().items():
+        print(f"cache: {tool_name} {stats['hits']} hits, {stats['coalesced']} coalesced, {stats['misses']} misses")
 
 
 if __name__ == '__main__':
@@ -0,0 +1,262 @@
+import asyncio
+import hashlib
+import json
+import os
+import re
+import time
+import zlib
+from collections import OrderedDict
+
+from google.adk.tools.base_tool import BaseTool
+from google.adk.tools.tool_context import ToolContext
+from google.genai import types
+from mcp.types import CallToolResult
+
+from sqlite_database import SqliteDatabase
+
+
+def path_arguments(args, root: str) -> list[str]:
+    """
+    Returns the existing files and directories that string arguments, also in lists and dicts, refer to.
+    """
+    if isinstance(args, dict):
+        return [path for value in args.values() for path in path_arguments(value, root)]
+    if isinstance(args, list):
+        return [path for value in args for path in path_arguments(value, root)]
+    if isinstance(args, str) and args:
+        path = os.path.join(root, os.path.expanduser(args))
+        if os.path.exists(path):
+            return [os.path.abspath(path)]
+    return []
+
+
+def file_versions(paths: list[str]) -> tuple:
+    versions = []
+    for path in paths:
+        try:
+            stat = os.stat(path)
+            versions.append((path, stat.st_mtime_ns, stat.st_size))
+        except OSError:
+            versions.append((path, None, None))
+    return tuple(versions)
+
+
+def is_read_only(tool: BaseTool) -> bool:
+    annotations = getattr(getattr(tool, "mcp_tool", None), "annotations", None)
+    return bool(getattr(annotations, "readOnlyHint", False))
+
+
+class McpToolCache:
+    """
+    Memoizes the results of read-only MCP tools within a process, least recently used results are evicted
+    beyond max_entries.
+
+    The key is the tool name with its arguments. Arguments that name files or directories are stat'ed
+    on every lookup, a result is only reused while their modification times and sizes are unchanged.
+    A directory changes its modification time when entries are added or removed, not when a file below it
+    is written, so recursive listings may be outdated until the next change of the directory itself.
+    """
+
+    def __init__(self, max_entries: int = 256, root: str = "."):
+        """
+        :param root: directory that relative paths in the arguments refer to, the one the MCP server was started in
+        """
+        self.max_entries = max_entries
+        self.root = root
+        self.results = OrderedDict()
+        self.hits = {}
+        self.misses = {}
+
+    def wrap(self, tools: list, read_only: bool = None) -> list:
+        """
+        Returns the tools with the read-only ones wrapped in a CachedMcpTool.
+
+        :param read_only: True if all tools are read-only, e.g. of a read-only server,
+            by default the readOnlyHint annotation of the MCP tools decides
+        """
+        return [CachedMcpTool(tool, self) if read_only or (read_only is None and is_read_only(tool)) else tool
+                for tool in tools]
+
+    async def call(self, tool: BaseTool, args: dict, tool_context: ToolContext):
+        key = (tool.name, json.dumps(args, sort_keys=True, default=str))
+        cached = self.results.get(key)
+        if cached is not None and file_versions([path for path, _, _ in cached[0]]) == cached[0]:
+            self.results.move_to_end(key)
+            self.hits[tool.name] = self.hits.get(tool.name, 0) + 1
+            return cached[1]
+        self.misses[tool.name] = self.misses.get(tool.name, 0) + 1
+
+        # The files are stat'ed before the call, a change during the call invalidates the result.
+        versions = file_versions(path_arguments(args, self.root))
+        result = await tool.run_async(args=args, tool_context=tool_context)
+        if getattr(result, "isError", False):
+            self.results.pop(key, None)
+            return result
+        self.results[key] = (versions, result)
+        self.results.move_to_end(key)
+        while len(self.results) > self.max_entries:
+            self.results.popitem(last=False)
+        return result
+
+    def clear(self):
+        self.results.clear()
+
+    def stats(self) -> dict:
+        """
+        Returns hits, misses and hit rate by tool name.
+        """
+        stats = {}
+        for name in sorted(set(self.hits) | set(self.misses)):
+            hits, misses = self.hits.get(name, 0), self.misses.get(name, 0)
+            stats[name] = {"hits": hits, "misses": misses, "hit_rate": hits / (hits + misses)}
+        return stats
+
+
+class CachedMcpTool(BaseTool):
+    """
+    Calls an MCP tool through an McpToolCache.
+    """
+
+    def __init__(self, tool: BaseTool, cache: McpToolCache):
+        super().__init__(name=tool.name, description=tool.description, is_long_running=tool.is_long_running)
+        self.tool = tool
+        self.cache = cache
+
+    def _get_declaration(self) -> types.FunctionDeclaration:
+        return self.tool._get_declaration()
+
+    async def run_async(self, *, args, tool_context: ToolContext):
+        return await self.cache.call(self.tool, args, tool_context)
+
+
+def normalize_arguments(args):
+    """
+    Collapses whitespace in string arguments, so that "Goetheallee  1 " and "Goetheallee 1" share an entry.
+    """
+    if isinstance(args, dict):
+        return {key: normalize_arguments(value) for key, value in args.items()}
+    if isinstance(args, list):
+        return [normalize_arguments(value) for value in args]
+    if isinstance(args, str):
+        return re.sub(r"\s+", " ", args).strip()
+    return args
+
+
+class PersistentToolCache:
+    """
+    Caches the results of MCP tools whose results don't depend on local files, e.g. of web APIs,
+    in the table mcp_tool_result of a SQLite database, so that they survive the process.
+
+    Every tool has its own time to live, tools without one are not cached.
+    Identical calls that run at the same time are coalesced into one call of the server,
+    this also applies to tools that are not cached.
+    """
+
+    def __init__(self, database: SqliteDatabase, ttl_seconds: dict[str, float], max_entries: int = 10000):
+        """
+        :param ttl_seconds: time to live of the results by tool name
+        :param max_entries: the oldest results are evicted beyond this
+        """
+        self.database = database
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self.in_flight: dict[str, asyncio.Future] = {}
+        self.hits = {}
+        self.misses = {}
+        self.coalesced = {}
+        with database.lock:
+            database.conn.execute('''
+                CREATE TABLE IF NOT EXISTS mcp_tool_result (
+                    key TEXT PRIMARY KEY NOT NULL,
+                    tool TEXT NOT NULL,
+                    result BLOB NOT NULL,
+                    created_at REAL NOT NULL,
+                    expires_at REAL NOT NULL
+                )
+            ''')
+            database.conn.execute("CREATE INDEX IF NOT EXISTS mcp_tool_result_created_at ON mcp_tool_result (created_at)")
+            database.conn.commit()
+
+    @staticmethod
+    def default_path() -> str:
+        """
+        Returns the file of the environment variable MCP_TOOL_CACHE or ~/.cache/mcp-tool-cache.db.
+        """
+        db_path = os.environ.get("MCP_TOOL_CACHE", os.path.expanduser("~/.cache/mcp-tool-cache.db"))
+        os.makedirs(os.path.dirname(os.path.abspath(db_path)), exist_ok=True)
+        return db_path
+
+    def wrap(self, tools: list) -> list:
+        return [CachedMcpTool(tool, self) for tool in tools]
+
+    def get(self, key: str):
+        with self.database.lock:
+            row = self.database.conn.execute("SELECT result FROM mcp_tool_result WHERE key = ? AND expires_at > ?",
+                                             (key, time.time())).fetchone()
+        return None if row is None else CallToolResult.model_validate_json(zlib.decompress(row[0]))
+
+    def put(self, key: str, tool_name: str, result: CallToolResult):
+        now = time.time()
+        conn = self.database.conn
+        with self.database.lock:
+            with conn:
+                conn.execute("INSERT OR REPLACE INTO mcp_tool_result VALUES (?, ?, ?, ?, ?)",
+                             (key, tool_name, zlib.compress(result.model_dump_json().encode("utf-8")),
+                              now, now + self.ttl_seconds[tool_name]))
+                conn.execute("DELETE FROM mcp_tool_result WHERE expires_at <= ?", (now,))
+                conn.execute('''
+                    DELETE FROM mcp_tool_result WHERE key IN (
+                        SELECT key FROM mcp_tool_result ORDER BY created_at DESC LIMIT -1 OFFSET ?
+                    )
+                ''', (self.max_entries,))
+
+    async def call(self, tool: BaseTool, args: dict, tool_context: ToolContext):
+        canonical_args = json.dumps(normalize_arguments(args), sort_keys=True, default=str)
+        key = hashlib.sha256(f"{tool.name}\n{canonical_args}".encode("utf-8")).hexdigest()
+        cached = tool.name in self.ttl_seconds
+        if cached:
+            result = await asyncio.to_thread(self.get, key)
+            if result is not None:
+                self.hits[tool.name] = self.hits.get(tool.name, 0) + 1
+                return result
+
+        future = self.in_flight.get(key)
+        if future is not None:
+            self.coalesced[tool.name] = self.coalesced.get(tool.name, 0) + 1
+            return await asyncio.shield(future)
+        self.misses[tool.name] = self.misses.get(tool.name, 0) + 1
+
+        future = asyncio.get_running_loop().create_future()
+        self.in_flight[key] = future
+        try:
+            result = await tool.run_async(args=args, tool_context=tool_context)
+            if cached and not getattr(result, "isError", False):
+                await asyncio.to_thread(self.put, key, tool.name, result)
+            future.set_result(result)
+            return result
+        except asyncio.CancelledError:
+            future.cancel()
+            raise
+        except Exception as e:
+            future.set_exception(e)
+            # Retrieved here, so that asyncio does not warn if no other call waits for it.
+            future.exception()
+            raise
+        finally:
+            del self.in_flight[key]
+
+    def clear(self):
+        with self.database.lock:
+            with self.database.conn:
+                self.database.conn.execute("DELETE FROM mcp_tool_result")
+
+    def stats(self) -> dict:
+        """
+        Returns hits, misses, coalesced calls and hit rate by tool name.
+        """
+        stats = {}
+        for name in sorted(set(self.hits) | set(self.misses) | set(self.coalesced)):
+            hits, misses, coalesced = self.hits.get(name, 0), self.misses.get(name, 0), self.coalesced.get(name, 0)
+            stats[name] = {"hits": hits, "misses": misses, "coalesced": coalesced,
+                           "hit_rate": (hits + coalesced) / (hits + misses + coalesced)}
+        return stats
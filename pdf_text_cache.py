@@ -0,0 +1,296 @@
+import argparse
+import hashlib
+import os
+import threading
+import time
+import zlib
+
+import PyPDF2
+from PyPDF2.generic import IndirectObject, StreamObject
+
+from extract_text import open_pdf
+from sqlite_database import SqliteDatabase
+
+# Part of every key, so that a new extractor never returns texts of an old one.
+EXTRACTOR_VERSION = f"PyPDF2-{PyPDF2.__version__}/2"
+
+
+def file_hash(pdf_path) -> str:
+    digest = hashlib.sha256(EXTRACTOR_VERSION.encode("utf-8"))
+    with open(pdf_path, 'rb') as file:
+        for block in iter(lambda: file.read(1024 * 1024), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def hash_object(digest, obj, seen: dict):
+    """
+    Hashes a PDF object with everything it refers to, e.g. fonts with their encodings and ToUnicode maps
+    or form XObjects with their content streams and own resources.
+    Objects that were already hashed are referred to by the order of their first occurrence,
+    so that the hash doesn't depend on the object numbers of the file.
+    """
+    if isinstance(obj, IndirectObject):
+        key = (obj.idnum, obj.generation)
+        if key in seen:
+            digest.update(f"@{seen[key]};".encode("utf-8"))
+            return
+        seen[key] = len(seen)
+        obj = obj.get_object()
+    if isinstance(obj, dict):
+        digest.update(b"<<")
+        for name in sorted(obj):
+            # The parent of a page tree node leads to all other pages.
+            if name != "/Parent":
+                digest.update(f"{name} ".encode("utf-8"))
+                hash_object(digest, obj[name], seen)
+        digest.update(b">>")
+        # The data of images don't influence the text.
+        if isinstance(obj, StreamObject) and obj.get("/Subtype") != "/Image":
+            digest.update(b"stream")
+            digest.update(obj.get_data())
+    elif isinstance(obj, list):
+        digest.update(b"[")
+        for item in obj:
+            hash_object(digest, item, seen)
+        digest.update(b"]")
+    else:
+        digest.update(f"{obj!r};".encode("utf-8"))
+
+
+def page_hash(page):
+    """
+    Hashes what the text of a page depends on: its content streams and its resources with everything
+    they refer to. Returns None if the page can't be hashed, then its text must not be cached.
+    """
+    digest = hashlib.sha256(EXTRACTOR_VERSION.encode("utf-8"))
+    try:
+        contents = page.get_contents()
+        if contents is not None:
+            digest.update(contents.get_data())
+        hash_object(digest, page.get("/Resources"), {})
+    except Exception:
+        return None
+    return digest.hexdigest()
+
+
+class PdfTextCache:
+    """
+    On-disk cache of the text of PDF pages.
+
+    A PDF whose content hash is known is answered without parsing it.
+    For a changed PDF only the pages with changed content streams or resources are extracted again.
+    The texts are evicted least recently used first when they get larger than max_bytes.
+    """
+
+    instances = {}
+    instances_lock = threading.Lock()
+
+    def __init__(self, database: SqliteDatabase, max_bytes: int = 256 * 1024 * 1024):
+        self.database = database
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        with database.lock:
+            conn = database.conn
+            conn.execute('''
+                CREATE TABLE IF NOT EXISTS pdf_document (
+                    file_hash TEXT PRIMARY KEY NOT NULL,
+                    path TEXT NOT NULL,
+                    page_count INTEGER NOT NULL,
+                    last_used REAL NOT NULL
+                )
+            ''')
+            conn.execute('''
+                CREATE TABLE IF NOT EXISTS pdf_document_page (
+                    file_hash TEXT NOT NULL,
+                    page_num INTEGER NOT NULL,
+                    page_hash TEXT NOT NULL,
+                    PRIMARY KEY (file_hash, page_num)
+                )
+            ''')
+            conn.execute('''
+                CREATE TABLE IF NOT EXISTS pdf_page (
+                    page_hash TEXT PRIMARY KEY NOT NULL,
+                    text BLOB NOT NULL,
+                    size INTEGER NOT NULL,
+                    last_used REAL NOT NULL
+                )
+            ''')
+            conn.execute("CREATE INDEX IF NOT EXISTS pdf_page_last_used ON pdf_page (last_used)")
+            conn.commit()
+
+    @classmethod
+    def for_database(cls, db_path: str = None) -> "PdfTextCache":
+        """
+        Returns the cache shared within this process, by default in the file of the environment
+        variable PDF_TEXT_CACHE or in ~/.cache/pdf-text-cache.db.
+        """
+        db_path = db_path or os.environ.get("PDF_TEXT_CACHE", os.path.expanduser("~/.cache/pdf-text-cache.db"))
+        with cls.instances_lock:
+            if db_path not in cls.instances:
+                os.makedirs(os.path.dirname(os.path.abspath(db_path)), exist_ok=True)
+                cls.instances[db_path] = cls(SqliteDatabase.for_path(db_path))
+            return cls.instances[db_path]
+
+    def cached_document(self, pdf_hash: str):
+        """
+        Returns the page texts of a known document or None if it is unknown or pages were evicted.
+        """
+        conn = self.database.conn
+        now = time.time()
+        with self.database.lock:
+            row = conn.execute("SELECT page_count FROM pdf_document WHERE file_hash = ?", (pdf_hash,)).fetchone()
+            if row is None:
+                return None
+            rows = conn.execute('''
+                SELECT p.text FROM pdf_document_page d JOIN pdf_page p ON p.page_hash = d.page_hash
+                WHERE d.file_hash = ? ORDER BY d.page_num
+            ''', (pdf_hash,)).fetchall()
+            if len(rows) != row[0]:
+                return None
+            with conn:
+                conn.execute("UPDATE pdf_document SET last_used = ? WHERE file_hash = ?", (now, pdf_hash))
+                conn.execute('''
+                    UPDATE pdf_page SET last_used = ?
+                    WHERE page_hash IN (SELECT page_hash FROM pdf_document_page WHERE file_hash = ?)
+                ''', (now, pdf_hash))
+        return [zlib.decompress(text).decode("utf-8") for (text,) in rows]
+
+    def cached_page(self, hash_of_page: str):
+        with self.database.lock:
+            row = self.database.conn.execute("SELECT text FROM pdf_page WHERE page_hash = ?",
+                                             (hash_of_page,)).fetchone()
+        return None if row is None else zlib.decompress(row[0]).decode("utf-8")
+
+    def get_pages(self, pdf_path) -> list[str]:
+        """
+        Returns the texts of all pages of a PDF file, from the cache as far as possible.
+        """
+        pdf_hash = file_hash(pdf_path)
+        texts = self.cached_document(pdf_hash)
+        if texts is not None:
+            self.hits += 1
+            return texts
+        self.misses += 1
+
+        texts = []
+        new_pages = {}
+        page_hashes = []
+        with open(pdf_path, 'rb') as file:
+            for page in open_pdf(file).pages:
+                hash_of_page = page_hash(page)
+                page_hashes.append(hash_of_page)
+                if hash_of_page is None:
+                    texts.append(page.extract_text() or "")
+                    continue
+                text = new_pages.get(hash_of_page)
+                if text is None:
+                    text = self.cached_page(hash_of_page)
+                if text is None:
+                    text = page.extract_text() or ""
+                    new_pages[hash_of_page] = text
+                texts.append(text)
+        self.put_document(pdf_hash, pdf_path, page_hashes, new_pages)
+        return texts
+
+    def put_document(self, pdf_hash: str, pdf_path, page_hashes: list, new_pages: dict):
+        """
+        Stores the new page texts, and the document only if all of its pages have a hash.
+        """
+        now = time.time()
+        conn = self.database.conn
+        with self.database.lock:
+            with conn:
+                conn.executemany("INSERT OR REPLACE INTO pdf_page VALUES (?, ?, ?, ?)", [
+                    (hash_of_page, zlib.compress(text.encode("utf-8")), len(text.encode("utf-8")), now)
+                    for hash_of_page, text in new_pages.items()
+                ])
+                if None not in page_hashes:
+                    conn.execute("DELETE FROM pdf_document_page WHERE file_hash = ?", (pdf_hash,))
+                    conn.executemany("INSERT INTO pdf_document_page VALUES (?, ?, ?)",
+                                     [(pdf_hash, page_num, hash_of_page)
+                                      for page_num, hash_of_page in enumerate(page_hashes)])
+                    conn.execute('''
+                        UPDATE pdf_page SET last_used = ?
+                        WHERE page_hash IN (SELECT page_hash FROM pdf_document_page WHERE file_hash = ?)
+                    ''', (now, pdf_hash))
+                    conn.execute("INSERT OR REPLACE INTO pdf_document VALUES (?, ?, ?, ?)",
+                                 (pdf_hash, os.path.abspath(pdf_path), len(page_hashes), now))
+        self.prune(self.max_bytes)
+
+    def prune(self, max_bytes: int) -> int:
+        """
+        Evicts the least recently used pages until their texts are at most max_bytes in total,
+        and the documents that lost pages. Returns the number of evicted pages.
+        """
+        conn = self.database.conn
+        with self.database.lock:
+            with conn:
+                evicted = conn.execute('''
+                    DELETE FROM pdf_page WHERE page_hash IN (
+                        SELECT page_hash FROM (
+                            SELECT page_hash, SUM(size) OVER (ORDER BY last_used DESC, page_hash) AS total
+                            FROM pdf_page
+                        ) WHERE total > ?
+                    )
+                ''', (max_bytes,)).rowcount
+                if evicted:
+                    conn.execute('''
+                        DELETE FROM pdf_document WHERE file_hash IN (
+                            SELECT d.file_hash FROM pdf_document_page d LEFT JOIN pdf_page p ON p.page_hash = d.page_hash
+                            WHERE p.page_hash IS NULL
+                        )
+                    ''')
+                    conn.execute("DELETE FROM pdf_document_page WHERE file_hash NOT IN (SELECT file_hash FROM pdf_document)")
+        return evicted
+
+    def clear(self):
+        with self.database.lock:
+            with self.database.conn:
+                for table in ("pdf_document", "pdf_document_page", "pdf_page"):
+                    self.database.conn.execute(f"DELETE FROM {table}")
+
+    def stats(self) -> dict:
+        with self.database.lock:
+            documents = self.database.conn.execute("SELECT COUNT(*) FROM pdf_document").fetchone()[0]
+            pages, size = self.database.conn.execute(
+                "SELECT COUNT(*), COALESCE(SUM(size), 0) FROM pdf_page").fetchone()
+        return {"documents": documents, "pages": pages, "bytes": size, "max_bytes": self.max_bytes,
+                "hits": self.hits, "misses": self.misses}
+
+    def documents(self) -> list[tuple]:
+        """
+        Returns (path, page count, last used) of the cached documents, most recently used first.
+        """
+        with self.database.lock:
+            return self.database.conn.execute(
+                "SELECT path, page_count, last_used FROM pdf_document ORDER BY last_used DESC").fetchall()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Inspects and prunes the PDF text cache.")
+    parser.add_argument("--db", help="cache file, defaults to $PDF_TEXT_CACHE or ~/.cache/pdf-text-cache.db")
+    commands = parser.add_subparsers(dest="command", required=True)
+    commands.add_parser("stats", help="show the size of the cache")
+    commands.add_parser("list", help="list the cached documents")
+    prune_parser = commands.add_parser("prune", help="evict least recently used pages")
+    prune_parser.add_argument("max_bytes", type=int, help="max. total size of the page texts")
+    commands.add_parser("clear", help="remove everything")
+    args = parser.parse_args()
+
+    cache = PdfTextCache.for_database(args.db)
+    if args.command == "stats":
+        for key, value in cache.stats().items():
+            print(f"{key}: {value}")
+    elif args.command == "list":
+        for path, page_count, last_used in cache.documents():
+            print(f"{time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(last_used))} {page_count:6d} pages  {path}")
+    elif args.command == "prune":
+        print(f"Evicted {cache.prune(args.max_bytes)} pages.")
+    elif args.command == "clear":
+        cache.clear()
+
+
+if __name__ == "__main__":
+    main()
@@ -3,10 +3,13 @@ import asyncio
 from google.adk.agents.loop_agent import LoopAgent
 from google.adk.agents.llm_agent import LlmAgent
 from google.genai import types
-from google.adk.sessions import InMemorySessionService
 from google.adk.runners import Runner
 from dotenv import load_dotenv
 
+from convergence import ConvergenceAgent
+from history_compaction import RollingSummaryAgent, state_instruction
+from sqlite_session_service import SqliteSessionService
+
 # Load environment variables from .env file
 load_dotenv()
 
@@ -21,27 +24,18 @@ GEMINI_MODEL = "gemini-2.5-flash-preview-04-17"
 # --- State Keys ---
 STATE_PRO = "supporting_arguments"
 STATE_CONTRA = "opposing_arguments"
+STATE_STATEMENT = "statement"
 
-pro_agent = LlmAgent(
-    name="ProAgent",
-    model=GEMINI_MODEL,
-    instruction=f"""
+PRO_INSTRUCTION = f"""
     You are a participant in a discussion started by the user.
     Check the session state for key '{STATE_PRO}'.
     If '{STATE_PRO}' does NOT exist or is empty, write a few (1-2 sentence) arguments that are in favour of the statement provided by the user.
     If the session key '{STATE_PRO}' *already exists*, update it to contradict the opposing arguments in '{STATE_CONTRA}'."
     Don't repeat the same arguments that have already been discussed earlier.
     Output *only* the story or the exact pass-through message.
-    """,
-    description="Writes the supporting arguments.",
-    output_key=STATE_PRO
-)
-
-# Contra Agent (LlmAgent)
-contra_agent = LlmAgent(
-    name="ContraAgent",
-    model=GEMINI_MODEL,
-    instruction=f"""
+    """
+
+CONTRA_INSTRUCTION = f"""
     You are a participant in a discussion.
     You are against the statement provided by the user and against the supporting arguments in state key '{STATE_PRO}'.
     Check the session state for key '{STATE_CONTRA}'.
@@ -49,28 +43,58 @@ contra_agent = LlmAgent(
     If the session key '{STATE_CONTRA}' *already exists*, update '{STATE_CONTRA}' to oppose the supporting arguments in state key '{STATE_PRO}'.
     Don't repeat the same arguments that have already been discussed earlier.
     Output *only* the story or the exact pass-through message.
-    """,
-    description="Writes the opposing arguments.",
-    output_key=STATE_CONTRA
-)
+    """
+
+
+def create_loop_agent(compact_history: bool = True, stop_on_convergence: bool = True) -> LoopAgent:
+    """
+    With compact_history the agents don't get the conversation of all rounds, only the statement,
+    the latest arguments of both sides and a short summary of the earlier rounds.
+    The statement has to be in the state key STATE_STATEMENT then.
+    With stop_on_convergence the loop stops before max_iterations once the arguments of both sides hardly change anymore.
+    """
+    state_keys = [STATE_PRO, STATE_CONTRA]
+    extra_instruction = state_instruction([STATE_STATEMENT] + state_keys) if compact_history else ""
+    include_contents = 'none' if compact_history else 'default'
+
+    pro_agent = LlmAgent(
+        name="ProAgent",
+        model=GEMINI_MODEL,
+        instruction=PRO_INSTRUCTION + extra_instruction,
+        description="Writes the supporting arguments.",
+        include_contents=include_contents,
+        output_key=STATE_PRO
+    )
 
-# Create the LoopAgent
-loop_agent = LoopAgent(
-    name="LoopAgent", sub_agents=[pro_agent, contra_agent], max_iterations=5
-)
+    # Contra Agent (LlmAgent)
+    contra_agent = LlmAgent(
+        name="ContraAgent",
+        model=GEMINI_MODEL,
+        instruction=CONTRA_INSTRUCTION + extra_instruction,
+        description="Writes the opposing arguments.",
+        include_contents=include_contents,
+        output_key=STATE_CONTRA
+    )
+
+    sub_agents = [pro_agent, contra_agent]
+    if compact_history:
+        sub_agents.append(RollingSummaryAgent(name="RollingSummary", state_keys=state_keys))
+    if stop_on_convergence:
+        sub_agents.append(ConvergenceAgent(name="Convergence", state_keys=state_keys))
+
+    # Create the LoopAgent
+    return LoopAgent(
+        name="LoopAgent", sub_agents=sub_agents, max_iterations=5
+    )
 
-# Session and Runner
-session_service = InMemorySessionService()
-session = session_service.create_session(app_name=APP_NAME, user_id=USER_ID, session_id=SESSION_ID)
-runner = Runner(agent=loop_agent, app_name=APP_NAME, session_service=session_service)
 
 # Agent Interaction
-async def call_agent(query):
+async def call_agent(runner, query):
     content = types.Content(role='user', parts=[types.Part(text=query)])
     events = runner.run_async(user_id=USER_ID, session_id=SESSION_ID, new_message=content)
 
     async for event in events:
-        if event.is_final_response():
+        if event.content is not None and event.is_final_response():
             final_response = event.content.parts[0].text.strip()
             print(f"{event.author}: {final_response}", end="\n\n")
 
@@ -84,5 +108,15 @@ async def call_agent(query):
 # STATEMENT = "OkHTTP is better suited for smaller not so complex project than Apache HTTP client."
 STATEMENT = "The Party says: 2 + 2 = 5. The Party is always right."
 
-print(f"Statement: {STATEMENT}", end="\n\n")
-asyncio.run(call_agent(STATEMENT))
+
+if __name__ == "__main__":
+    # Session and Runner
+    session_service = SqliteSessionService.for_database()
+    # Every run starts a new session, the last one stays in the database for inspection.
+    session_service.delete_session(app_name=APP_NAME, user_id=USER_ID, session_id=SESSION_ID)
+    session = session_service.create_session(app_name=APP_NAME, user_id=USER_ID, session_id=SESSION_ID,
+                                             state={STATE_STATEMENT: STATEMENT})
+    runner = Runner(agent=create_loop_agent(), app_name=APP_NAME, session_service=session_service)
+
+    print(f"Statement: {STATEMENT}", end="\n\n")
+    asyncio.run(call_agent(runner, STATEMENT))
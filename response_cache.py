@@ -0,0 +1,125 @@
+import hashlib
+import json
+import threading
+import time
+
+from sqlite_database import SqliteDatabase
+
+
+class ResponseCache:
+    """
+    Persistent cache of LLM responses in the table llm_response of a SQLite database.
+
+    Entries are keyed by a hash over model, url, prompt selector, language, the complete prompt and the input text.
+    Changing the model or a prompt therefore produces new keys, the old entries are never hit again
+    and disappear by LRU eviction or when their time to live is over.
+    """
+
+    # Avoids a database write on every hit, last_used is only updated if it is older than this.
+    touch_interval = 60.0
+
+    instances = {}
+    instances_lock = threading.Lock()
+
+    def __init__(self, database: SqliteDatabase, ttl_seconds: float = 30 * 24 * 3600,
+                 max_bytes: int = 64 * 1024 * 1024):
+        """
+        :param database: usually the connection of youtube-transcript.db
+        :param ttl_seconds: entries older than this are not returned anymore
+        :param max_bytes: least recently used entries are evicted when the responses get larger than this in total
+        """
+        self.ttl_seconds = ttl_seconds
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self.lock = database.lock
+        self.conn = database.conn
+        with self.lock:
+            self.create_table()
+
+    def create_table(self):
+        self.conn.execute('''
+            CREATE TABLE IF NOT EXISTS llm_response (
+                key TEXT PRIMARY KEY NOT NULL,
+                model TEXT NOT NULL,
+                prompt_selector TEXT NOT NULL,
+                response TEXT NOT NULL,
+                size INTEGER NOT NULL,
+                created_at REAL NOT NULL,
+                last_used REAL NOT NULL
+            )
+        ''')
+        self.conn.execute("CREATE INDEX IF NOT EXISTS llm_response_last_used ON llm_response (last_used)")
+        self.conn.commit()
+
+    @classmethod
+    def for_database(cls, db_path: str) -> "ResponseCache":
+        """
+        Returns the cache of db_path that is shared within this process.
+        """
+        with cls.instances_lock:
+            if db_path not in cls.instances:
+                cls.instances[db_path] = cls(SqliteDatabase.for_path(db_path))
+            return cls.instances[db_path]
+
+    @staticmethod
+    def make_key(model: str, url: str, prompt_selector: str, language: str, prompt: str, input_text: str) -> str:
+        """
+        Computes the cache key of a request, prompt is everything sent to the model except input_text.
+        """
+        input_hash = hashlib.sha256(input_text.encode("utf-8")).hexdigest()
+        fields = [model, url, prompt_selector, language, prompt, input_hash]
+        return hashlib.sha256(json.dumps(fields).encode("utf-8")).hexdigest()
+
+    def get(self, key: str):
+        """
+        Returns the cached response or None.
+        """
+        now = time.time()
+        with self.lock:
+            row = self.conn.execute("SELECT response, created_at, last_used FROM llm_response WHERE key = ?",
+                                    (key,)).fetchone()
+            if row is None or row[1] < now - self.ttl_seconds:
+                self.misses += 1
+                return None
+            self.hits += 1
+            if row[2] < now - self.touch_interval:
+                self.conn.execute("UPDATE llm_response SET last_used = ? WHERE key = ?", (now, key))
+                self.conn.commit()
+            return row[0]
+
+    def put(self, key: str, response: str, model: str, prompt_selector: str):
+        """
+        Stores a response and evicts expired and least recently used entries.
+        """
+        now = time.time()
+        with self.lock:
+            self.conn.execute("INSERT OR REPLACE INTO llm_response VALUES (?, ?, ?, ?, ?, ?, ?)",
+                              (key, model, prompt_selector, response, len(response.encode("utf-8")), now, now))
+            self.conn.execute("DELETE FROM llm_response WHERE created_at < ?", (now - self.ttl_seconds,))
+            self.conn.execute('''
+                DELETE FROM llm_response WHERE key IN (
+                    SELECT key FROM (
+                        SELECT key, SUM(size) OVER (ORDER BY last_used DESC, created_at DESC) AS total
+                        FROM llm_response
+                    ) WHERE total > ?
+                )
+            ''', (self.max_bytes,))
+            self.conn.commit()
+
+    def stats(self) -> dict:
+        with self.lock:
+            entries, size = self.conn.execute("SELECT COUNT(*), COALESCE(SUM(size), 0) FROM llm_response").fetchone()
+            lookups = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+                "entries": entries,
+                "bytes": size,
+            }
+
+    def clear(self):
+        with self.lock:
+            self.conn.execute("DELETE FROM llm_response")
+            self.conn.commit()
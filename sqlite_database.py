@@ -0,0 +1,43 @@
+import sqlite3
+import threading
+
+
+class SqliteDatabase:
+    """
+    One long-lived SQLite connection per database file and process, shared by all threads.
+
+    The connection uses WAL mode, so other processes, e.g. concurrent Lambda containers
+    on a shared file system, can read while this one writes.
+    Statements are executed with constant SQL strings, so sqlite3 reuses its prepared statements.
+    """
+
+    instances = {}
+    instances_lock = threading.Lock()
+
+    def __init__(self, db_path: str, cache_size_kib: int = 8 * 1024, busy_timeout_ms: int = 5000):
+        self.db_path = db_path
+        # The connection is used by many threads but only while holding lock.
+        self.lock = threading.RLock()
+        self.conn = sqlite3.connect(db_path, check_same_thread=False, cached_statements=256)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        # Durable enough with WAL: a crash can only lose the last transactions, not corrupt the database.
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.execute(f"PRAGMA cache_size=-{int(cache_size_kib)}")
+        self.conn.execute("PRAGMA temp_store=MEMORY")
+        self.conn.execute(f"PRAGMA busy_timeout={int(busy_timeout_ms)}")
+
+    @classmethod
+    def for_path(cls, db_path: str) -> "SqliteDatabase":
+        """
+        Returns the connection of db_path that is shared within this process.
+        """
+        with cls.instances_lock:
+            if db_path not in cls.instances:
+                cls.instances[db_path] = cls(db_path)
+            return cls.instances[db_path]
+
+    def close(self):
+        with self.instances_lock:
+            self.instances.pop(self.db_path, None)
+        with self.lock:
+            self.conn.close()
@@ -0,0 +1,348 @@
+import copy
+import json
+import os
+import threading
+import time
+import uuid
+import zlib
+from collections import OrderedDict
+from typing import Any, Optional
+
+from google.adk.events.event import Event
+from google.adk.sessions.base_session_service import (BaseSessionService, GetSessionConfig, ListEventsResponse,
+                                                      ListSessionsResponse)
+from google.adk.sessions.session import Session
+from google.adk.sessions.state import State
+
+from sqlite_database import SqliteDatabase
+
+
+def split_state(state: dict) -> tuple[dict, dict, dict]:
+    """
+    Splits a state into the session, app and user parts, app and user keys without their prefixes.
+    Temporary keys are dropped.
+    """
+    session_state, app_state, user_state = {}, {}, {}
+    for key, value in state.items():
+        if key.startswith(State.APP_PREFIX):
+            app_state[key.removeprefix(State.APP_PREFIX)] = value
+        elif key.startswith(State.USER_PREFIX):
+            user_state[key.removeprefix(State.USER_PREFIX)] = value
+        elif not key.startswith(State.TEMP_PREFIX):
+            session_state[key] = value
+    return session_state, app_state, user_state
+
+
+def events_to_keep(events: list[Event], keep_events: int) -> int:
+    """
+    Returns the number of newest events to keep, at least keep_events, so that the cut is between two invocations.
+    """
+    cut = max(len(events) - keep_events, 0)
+    while 0 < cut < len(events) and events[cut].invocation_id == events[cut - 1].invocation_id:
+        cut -= 1
+    return len(events) - cut
+
+
+class SqliteSessionService(BaseSessionService):
+    """
+    Stores ADK sessions in a SQLite database, so that they survive a restart of the agent.
+
+    Events are appended to the table adk_event and never updated. The session state is not rewritten
+    on every event: a snapshot is stored every snapshot_interval events, the state is the latest snapshot
+    with the state deltas of the later events applied. App and user state are stored once in their own tables
+    and merged into every session as in InMemorySessionService.
+
+    Recently used sessions are kept in memory, at most max_cached_sessions of them.
+    A cached session doesn't see the events that other processes append to it.
+    The oldest events of a session are deleted when it has more than max_events, about the newest keep_events
+    are kept. Only whole invocations are deleted, so that no request or function call loses its counterpart,
+    and the session of the running invocation keeps all its events. The state is unaffected, it is snapshotted first.
+    """
+
+    instances = {}
+    instances_lock = threading.Lock()
+
+    def __init__(self, database: SqliteDatabase, snapshot_interval: int = 20, max_cached_sessions: int = 64,
+                 max_events: int = 500, keep_events: int = 100):
+        """
+        :param snapshot_interval: number of events after which the state is stored as a whole
+        :param max_cached_sessions: number of sessions kept in memory
+        :param max_events: events of a session beyond which old events are deleted, None keeps all events,
+            agents that see the conversation only see the kept events of earlier invocations
+        :param keep_events: number of events that are kept when old events are deleted
+        """
+        self.database = database
+        self.snapshot_interval = snapshot_interval
+        self.max_cached_sessions = max_cached_sessions
+        self.max_events = max_events
+        self.keep_events = keep_events
+        # Full sessions, without app and user state, by (app name, user id, session id).
+        self.cache = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        with database.lock:
+            conn = database.conn
+            conn.execute('''
+                CREATE TABLE IF NOT EXISTS adk_session (
+                    app_name TEXT NOT NULL,
+                    user_id TEXT NOT NULL,
+                    session_id TEXT NOT NULL,
+                    state TEXT NOT NULL,
+                    snapshot_seq INTEGER NOT NULL,
+                    last_seq INTEGER NOT NULL,
+                    create_time REAL NOT NULL,
+                    last_update_time REAL NOT NULL,
+                    PRIMARY KEY (app_name, user_id, session_id)
+                ) WITHOUT ROWID
+            ''')
+            conn.execute('''
+                CREATE TABLE IF NOT EXISTS adk_event (
+                    app_name TEXT NOT NULL,
+                    user_id TEXT NOT NULL,
+                    session_id TEXT NOT NULL,
+                    seq INTEGER NOT NULL,
+                    timestamp REAL NOT NULL,
+                    state_delta TEXT,
+                    data BLOB NOT NULL,
+                    PRIMARY KEY (app_name, user_id, session_id, seq)
+                )
+            ''')
+            conn.execute('''
+                CREATE TABLE IF NOT EXISTS adk_app_state (
+                    app_name TEXT PRIMARY KEY NOT NULL,
+                    state TEXT NOT NULL
+                )
+            ''')
+            conn.execute('''
+                CREATE TABLE IF NOT EXISTS adk_user_state (
+                    app_name TEXT NOT NULL,
+                    user_id TEXT NOT NULL,
+                    state TEXT NOT NULL,
+                    PRIMARY KEY (app_name, user_id)
+                )
+            ''')
+            conn.commit()
+
+    @classmethod
+    def for_database(cls, db_path: str = None, **options) -> "SqliteSessionService":
+        """
+        Returns the service shared within this process, by default in the file of the environment
+        variable ADK_SESSION_DB or in ~/.cache/adk-sessions.db.
+        """
+        db_path = db_path or os.environ.get("ADK_SESSION_DB", os.path.expanduser("~/.cache/adk-sessions.db"))
+        with cls.instances_lock:
+            if db_path not in cls.instances:
+                os.makedirs(os.path.dirname(os.path.abspath(db_path)), exist_ok=True)
+                cls.instances[db_path] = cls(SqliteDatabase.for_path(db_path), **options)
+            return cls.instances[db_path]
+
+    def create_session(self, *, app_name: str, user_id: str, state: Optional[dict[str, Any]] = None,
+                       session_id: Optional[str] = None) -> Session:
+        session_id = session_id.strip() if session_id and session_id.strip() else str(uuid.uuid4())
+        session_state, app_state, user_state = split_state(state or {})
+        now = time.time()
+        conn = self.database.conn
+        with self.database.lock:
+            with conn:
+                if conn.execute("SELECT 1 FROM adk_session WHERE app_name = ? AND user_id = ? AND session_id = ?",
+                                (app_name, user_id, session_id)).fetchone():
+                    raise ValueError(f"The session {session_id} of {app_name}/{user_id} exists already.")
+                conn.execute("INSERT INTO adk_session VALUES (?, ?, ?, ?, 0, 0, ?, ?)",
+                             (app_name, user_id, session_id, json.dumps(session_state), now, now))
+                self.update_shared_state(app_name, user_id, app_state, user_state)
+            session = Session(app_name=app_name, user_id=user_id, id=session_id, state=session_state,
+                              last_update_time=now)
+            self.cache_session(session)
+            return self.merge_state(copy.deepcopy(session))
+
+    def get_session(self, *, app_name: str, user_id: str, session_id: str,
+                    config: Optional[GetSessionConfig] = None) -> Optional[Session]:
+        key = (app_name, user_id, session_id)
+        with self.database.lock:
+            session = self.cache.get(key)
+            if session is not None:
+                self.hits += 1
+                self.cache.move_to_end(key)
+                session = copy.deepcopy(session)
+            elif config and config.num_recent_events:
+                # Only the recent events are read, such a session is not cached.
+                self.misses += 1
+                session = self.load_session(key, config.num_recent_events)
+            else:
+                self.misses += 1
+                session = self.load_session(key)
+                if session is not None:
+                    self.cache_session(session)
+                    session = copy.deepcopy(session)
+            if session is None:
+                return None
+            if config and config.num_recent_events:
+                session.events = session.events[-config.num_recent_events:]
+            elif config and config.after_timestamp:
+                session.events = [event for event in session.events if event.timestamp >= config.after_timestamp]
+            return self.merge_state(session)
+
+    def load_session(self, key: tuple, num_recent_events: int = None) -> Optional[Session]:
+        conn = self.database.conn
+        row = conn.execute('''
+            SELECT state, snapshot_seq, last_update_time FROM adk_session
+            WHERE app_name = ? AND user_id = ? AND session_id = ?
+        ''', key).fetchone()
+        if row is None:
+            return None
+        state, snapshot_seq, last_update_time = json.loads(row[0]), row[1], row[2]
+        for (state_delta,) in conn.execute('''
+            SELECT state_delta FROM adk_event
+            WHERE app_name = ? AND user_id = ? AND session_id = ? AND seq > ? AND state_delta IS NOT NULL
+            ORDER BY seq
+        ''', (*key, snapshot_seq)):
+            state.update(split_state(json.loads(state_delta))[0])
+        if num_recent_events:
+            rows = conn.execute('''
+                SELECT data FROM adk_event WHERE app_name = ? AND user_id = ? AND session_id = ?
+                ORDER BY seq DESC LIMIT ?
+            ''', (*key, num_recent_events)).fetchall()[::-1]
+        else:
+            rows = conn.execute('''
+                SELECT data FROM adk_event WHERE app_name = ? AND user_id = ? AND session_id = ? ORDER BY seq
+            ''', key).fetchall()
+        events = [Event.model_validate_json(zlib.decompress(data)) for (data,) in rows]
+        return Session(app_name=key[0], user_id=key[1], id=key[2], state=state, events=events,
+                       last_update_time=last_update_time)
+
+    def cache_session(self, session: Session):
+        key = (session.app_name, session.user_id, session.id)
+        self.cache[key] = session
+        self.cache.move_to_end(key)
+        while len(self.cache) > self.max_cached_sessions:
+            self.cache.popitem(last=False)
+
+    def merge_state(self, session: Session) -> Session:
+        """
+        Adds the app and user state with their prefixes to a copy of a session.
+        """
+        conn = self.database.conn
+        row = conn.execute("SELECT state FROM adk_app_state WHERE app_name = ?", (session.app_name,)).fetchone()
+        if row is not None:
+            session.state.update({State.APP_PREFIX + key: value for key, value in json.loads(row[0]).items()})
+        row = conn.execute("SELECT state FROM adk_user_state WHERE app_name = ? AND user_id = ?",
+                           (session.app_name, session.user_id)).fetchone()
+        if row is not None:
+            session.state.update({State.USER_PREFIX + key: value for key, value in json.loads(row[0]).items()})
+        return session
+
+    def update_shared_state(self, app_name: str, user_id: str, app_state: dict, user_state: dict):
+        conn = self.database.conn
+        if app_state:
+            row = conn.execute("SELECT state FROM adk_app_state WHERE app_name = ?", (app_name,)).fetchone()
+            conn.execute("INSERT OR REPLACE INTO adk_app_state VALUES (?, ?)",
+                         (app_name, json.dumps({**(json.loads(row[0]) if row else {}), **app_state})))
+        if user_state:
+            row = conn.execute("SELECT state FROM adk_user_state WHERE app_name = ? AND user_id = ?",
+                               (app_name, user_id)).fetchone()
+            conn.execute("INSERT OR REPLACE INTO adk_user_state VALUES (?, ?, ?)",
+                         (app_name, user_id, json.dumps({**(json.loads(row[0]) if row else {}), **user_state})))
+
+    def append_event(self, session: Session, event: Event) -> Event:
+        if event.partial:
+            return event
+        super().append_event(session=session, event=event)
+        session.last_update_time = event.timestamp
+
+        key = (session.app_name, session.user_id, session.id)
+        state_delta = event.actions.state_delta if event.actions else None
+        conn = self.database.conn
+        with self.database.lock:
+            row = conn.execute('''
+                SELECT snapshot_seq, last_seq FROM adk_session WHERE app_name = ? AND user_id = ? AND session_id = ?
+            ''', key).fetchone()
+            if row is None:
+                return event
+            snapshot_seq, seq = row[0], row[1] + 1
+            stored = self.cache.get(key) or self.load_session(key)
+            super().append_event(session=stored, event=event)
+            stored.last_update_time = event.timestamp
+            self.cache_session(stored)
+            with conn:
+                conn.execute("INSERT INTO adk_event VALUES (?, ?, ?, ?, ?, ?, ?)",
+                             (*key, seq, event.timestamp, json.dumps(state_delta) if state_delta else None,
+                              zlib.compress(event.model_dump_json(exclude_none=True).encode("utf-8"))))
+                if state_delta:
+                    _, app_state, user_state = split_state(state_delta)
+                    self.update_shared_state(session.app_name, session.user_id, app_state, user_state)
+                if seq - snapshot_seq >= self.snapshot_interval:
+                    conn.execute('''
+                        UPDATE adk_session SET state = ?, snapshot_seq = ?
+                        WHERE app_name = ? AND user_id = ? AND session_id = ?
+                    ''', (json.dumps(split_state(stored.state)[0]), seq, *key))
+                conn.execute('''
+                    UPDATE adk_session SET last_seq = ?, last_update_time = ?
+                    WHERE app_name = ? AND user_id = ? AND session_id = ?
+                ''', (seq, event.timestamp, *key))
+            if self.max_events and len(stored.events) > self.max_events:
+                self.compact(*key, keep_events=self.keep_events)
+        return event
+
+    def compact(self, app_name: str, user_id: str, session_id: str, keep_events: int = None) -> int:
+        """
+        Deletes all but the newest keep_events events of a session after storing a snapshot of its state.
+        More events are kept if the cut would split an invocation.
+
+        :return: the number of deleted events
+        """
+        keep_events = self.keep_events if keep_events is None else keep_events
+        key = (app_name, user_id, session_id)
+        conn = self.database.conn
+        with self.database.lock:
+            stored = self.cache.get(key) or self.load_session(key)
+            if stored is None:
+                return 0
+            keep_events = events_to_keep(stored.events, keep_events)
+            if keep_events >= len(stored.events):
+                return 0
+            with conn:
+                conn.execute('''
+                    UPDATE adk_session SET state = ?, snapshot_seq = last_seq
+                    WHERE app_name = ? AND user_id = ? AND session_id = ?
+                ''', (json.dumps(split_state(stored.state)[0]), *key))
+                deleted = conn.execute('''
+                    DELETE FROM adk_event WHERE app_name = ? AND user_id = ? AND session_id = ? AND seq <= (
+                        SELECT last_seq - ? FROM adk_session WHERE app_name = ? AND user_id = ? AND session_id = ?
+                    )
+                ''', (*key, keep_events, *key)).rowcount
+            stored.events = stored.events[len(stored.events) - keep_events:] if keep_events else []
+            self.cache_session(stored)
+        return deleted
+
+    def list_sessions(self, *, app_name: str, user_id: str) -> ListSessionsResponse:
+        with self.database.lock:
+            rows = self.database.conn.execute('''
+                SELECT session_id, last_update_time FROM adk_session WHERE app_name = ? AND user_id = ?
+                ORDER BY last_update_time DESC
+            ''', (app_name, user_id)).fetchall()
+        return ListSessionsResponse(sessions=[
+            Session(app_name=app_name, user_id=user_id, id=session_id, last_update_time=last_update_time)
+            for session_id, last_update_time in rows
+        ])
+
+    def delete_session(self, *, app_name: str, user_id: str, session_id: str) -> None:
+        key = (app_name, user_id, session_id)
+        with self.database.lock:
+            with self.database.conn:
+                self.database.conn.execute(
+                    "DELETE FROM adk_event WHERE app_name = ? AND user_id = ? AND session_id = ?", key)
+                self.database.conn.execute(
+                    "DELETE FROM adk_session WHERE app_name = ? AND user_id = ? AND session_id = ?", key)
+            self.cache.pop(key, None)
+
+    def list_events(self, *, app_name: str, user_id: str, session_id: str) -> ListEventsResponse:
+        session = self.get_session(app_name=app_name, user_id=user_id, session_id=session_id)
+        return ListEventsResponse(events=session.events if session else [])
+
+    def stats(self) -> dict:
+        with self.database.lock:
+            sessions = self.database.conn.execute("SELECT COUNT(*) FROM adk_session").fetchone()[0]
+            events = self.database.conn.execute("SELECT COUNT(*) FROM adk_event").fetchone()[0]
+            cached = len(self.cache)
+        return {"sessions": sessions, "events": events, "cached_sessions": cached,
+                "hits": self.hits, "misses": self.misses}
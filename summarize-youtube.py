@@ -1,6 +1,6 @@
 # Summarizes a YouTube video in file final-summary.md.
 # Writes additional files transcript.txt, summary.md, and title.md.
-# Caches the transcripts in the sqlite database youtube-transcript.db.
+# Caches the transcripts and the LLM responses in the sqlite database youtube-transcript.db.
 
 from youtube_summarizer import YouTubeSummarizer
 
@@ -8,3 +8,12 @@ from youtube_summarizer import YouTubeSummarizer
 summarizer = YouTubeSummarizer("5ZWeCKY5WZE")
 summarizer.summarize()
 #print(summarizer.jsonSummary())
+
+# summarize several videos concurrently
+# from youtube_summarizer import summarize_many
+# for result in summarize_many(["5ZWeCKY5WZE", "dMcZPkYUBxU"], concurrency=4, summary_concurrency=2):
+#     print(result.video_id, result.error or result.title)
+
+# stream the summary while it is generated
+# for delta in YouTubeSummarizer("5ZWeCKY5WZE").summarize_stream():
+#     print(delta, end="", flush=True)
@@ -1,6 +1,8 @@
 import asyncio
+import glob
 import json
-import mimetypes
+import os
+import threading
 
 from dotenv import load_dotenv
 from google.adk.agents.callback_context import CallbackContext
@@ -8,14 +10,24 @@ from google.adk.agents.llm_agent import LlmAgent
 from google.adk.artifacts.in_memory_artifact_service import InMemoryArtifactService
 from google.adk.models import LlmRequest, LlmResponse
 from google.adk.runners import Runner
-from google.adk.sessions import InMemorySessionService
 from google.adk.tools import ToolContext, FunctionTool
 from google.adk.tools.agent_tool import AgentTool
 from google.genai import types
 from pydantic import BaseModel, Field
 
+from file_parts import FilePartProvider
+from sqlite_session_service import SqliteSessionService
+
 load_dotenv()
 
+# Limits of execute_task_on_files.
+max_parallel_files = 8
+file_task_timeout = 300.0
+max_files = 100
+
+# Small files are sent inline, large ones are uploaded once and referenced.
+file_parts = FilePartProvider()
+
 
 class FileTaskInput(BaseModel):
     """
@@ -35,17 +47,11 @@ def set_user_prompt(callback_context: CallbackContext, llm_request: LlmRequest):
     args = json.loads(callback_context.user_content.parts[0].text)
     filename = args["filename"]
     try:
-        with open(filename, "rb") as f:
-            file_content = f.read()
+        file_artifact = file_parts.part_for(filename)
     except FileNotFoundError:
         return LlmResponse(content=types.Content(
             role="model",
             parts=[types.Part(text=f"The file {filename} was not found.")]))
-    mime_type = mimetypes.guess_type(filename)[0] or "application/octet-stream"
-    file_artifact = types.Part.from_bytes(
-        data=file_content,
-        mime_type=mime_type,
-    )
     user_prompt = types.Part.from_text(text=args["user_prompt"])
     llm_request.contents[0].parts = [user_prompt, file_artifact]
 
@@ -66,6 +72,36 @@ def get_file_agent():
     )
 
 
+# The file agent and its tool are built once per process.
+# They hold configuration only, AgentTool.run_async creates a new runner and session for every call,
+# so concurrent calls can share them.
+agent_tools = {}
+agent_tools_lock = threading.Lock()
+
+
+def get_agent_tool(name: str, factory) -> AgentTool:
+    """
+    Returns the AgentTool of the agent that is registered by name, creates it with factory on first use.
+    """
+    with agent_tools_lock:
+        agent_tool = agent_tools.get(name)
+        if agent_tool is None:
+            agent_tool = agent_tools[name] = AgentTool(factory())
+        return agent_tool
+
+
+async def upload_large_file(filename: str):
+    """
+    Uploads a file larger than the inline limit in a worker thread. The before_model_callback of the file agent
+    is synchronous and would upload it on the thread of the event loop, it then finds the handle cached.
+    Small files are only read by the callback.
+
+    :raises FileNotFoundError: if the file does not exist
+    """
+    if os.stat(filename).st_size > file_parts.inline_limit:
+        await asyncio.to_thread(file_parts.part_for, filename)
+
+
 async def execute_task_on_file_by_name(filename: str, user_prompt: str, tool_context: ToolContext):
     """
     Fetches a file by filename and executes a task on it.
@@ -77,13 +113,96 @@ async def execute_task_on_file_by_name(filename: str, user_prompt: str, tool_con
     Returns:
         str: The output of the tasks
     """
-    agent_tool = AgentTool(get_file_agent())
+    try:
+        await upload_large_file(filename)
+    except FileNotFoundError:
+        return f"The file {filename} was not found."
+    agent_tool = get_agent_tool("file_agent", get_file_agent)
     agent_output = await agent_tool.run_async(
         args={"filename": filename, "user_prompt": user_prompt},
         tool_context=tool_context)
     return agent_output
 
 
+def expand_filenames(filenames: list[str]) -> list[str]:
+    """
+    Expands glob patterns, names without a match are kept so that they are reported as not found.
+    """
+    expanded = []
+    for filename in filenames:
+        expanded.extend(sorted(glob.glob(filename, recursive=True)) if glob.has_magic(filename) else [filename])
+    return list(dict.fromkeys(expanded))
+
+
+async def iter_file_task_results(filenames: list[str], user_prompt: str, tool_context: ToolContext,
+                                 concurrency: int = None, timeout: float = None):
+    """
+    Executes the same task on many files concurrently.
+
+    :param concurrency: max. number of files processed at the same time, defaults to max_parallel_files
+    :param timeout: max. seconds per file, defaults to file_task_timeout
+    :return: async generator of (filename, status, output or error message) in the order the files are finished
+    """
+    limit = asyncio.Semaphore(concurrency or max_parallel_files)
+    agent_tool = get_agent_tool("file_agent", get_file_agent)
+
+    async def run_task(filename: str):
+        await upload_large_file(filename)
+        return await agent_tool.run_async(args={"filename": filename, "user_prompt": user_prompt},
+                                          tool_context=tool_context)
+
+    async def execute_task(filename: str):
+        async with limit:
+            try:
+                # The timeout includes the upload, a file that is stuck in processing doesn't block the tool.
+                output = await asyncio.wait_for(run_task(filename), timeout or file_task_timeout)
+                return filename, "success", output
+            except FileNotFoundError:
+                return filename, "error", f"The file {filename} was not found."
+            except asyncio.TimeoutError:
+                return filename, "error", f"The task on {filename} timed out."
+            except Exception as e:
+                return filename, "error", f"The task on {filename} failed: {e}"
+
+    tasks = [asyncio.create_task(execute_task(filename)) for filename in filenames]
+    try:
+        for task in asyncio.as_completed(tasks):
+            yield await task
+    finally:
+        for task in tasks:
+            task.cancel()
+
+
+async def execute_task_on_files(filenames: list[str], user_prompt: str, tool_context: ToolContext):
+    """
+    Executes the same task on many files at once, use it instead of execute_task_on_file_by_name for more than one file.
+
+    Args:
+        filenames (list[str]): The names of the files, may contain glob patterns like "docs/*.pdf"
+        user_prompt (str): What the user wants to do with each of these files.
+
+    Returns:
+        dict: status and the output or error message for each file
+    """
+    filenames = expand_filenames(filenames)
+    if not filenames:
+        return {"status": "error", "error_message": "No file matches the given names."}
+    if len(filenames) > max_files:
+        return {"status": "error",
+                "error_message": f"{len(filenames)} files match, at most {max_files} can be processed at once."}
+    results = {}
+    async for filename, status, output in iter_file_task_results(filenames, user_prompt, tool_context):
+        # The runner emits the function response when all files are done, progress is printed meanwhile.
+        print(f"progress: {filename}: {status} ({len(results) + 1}/{len(filenames)} files)")
+        if status == "success":
+            results[filename] = {"status": status, "output": output}
+        else:
+            results[filename] = {"status": status, "error_message": output}
+    failed = sum(result["status"] != "success" for result in results.values())
+    return {"status": "success" if not failed else "partial" if failed < len(results) else "error",
+            "results": {filename: results[filename] for filename in filenames}}
+
+
 async def get_root_agent():
     """
     Creates an Agent that works as an assistent.
@@ -94,7 +213,7 @@ async def get_root_agent():
         instruction="""
         You are a helpful assistent that answers the user's questions.
         """,
-        tools=[FunctionTool(execute_task_on_file_by_name)],
+        tools=[FunctionTool(execute_task_on_file_by_name), FunctionTool(execute_task_on_files)],
     )
 
 
@@ -130,7 +249,7 @@ async def run_agent(runner, session):
 
 
 async def async_main():
-    session_service = InMemorySessionService()
+    session_service = SqliteSessionService.for_database()
     # Artifact service might not be needed for this example
     artifacts_service = InMemoryArtifactService()
 
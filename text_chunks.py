@@ -0,0 +1,92 @@
+import re
+
+# Auto-generated transcripts often have no punctuation at all, then the words are the boundaries.
+SENTENCE_END = re.compile(r"(?<=[.!?])\s+")
+
+
+def split_units(text: str, max_length: int) -> list[str]:
+    """
+    Splits text into sentences, sentences longer than max_length into words
+    and words longer than max_length into pieces of max_length characters.
+    """
+    units = []
+    for sentence in SENTENCE_END.split(text.strip()):
+        if len(sentence) <= max_length:
+            if sentence:
+                units.append(sentence)
+            continue
+        for word in sentence.split():
+            units.extend(word[i:i + max_length] for i in range(0, len(word), max_length))
+    return units
+
+
+def pack_units(units: list[str], max_length: int, overlap: int = 0, separator: str = " ") -> list[str]:
+    """
+    Joins consecutive units into chunks of at most max_length characters.
+
+    :param units: texts that must not be split, each of them at most max_length long
+    :param max_length: max. length of a chunk
+    :param overlap: max. number of characters at the end of a chunk that are repeated at the start of the next one
+    :param separator: joins the units of a chunk
+    """
+    if overlap >= max_length:
+        raise ValueError("overlap must be smaller than max_length")
+    chunks = []
+    current = []
+    length = 0
+    for unit in units:
+        added = len(unit) + (len(separator) if current else 0)
+        if current and length + added > max_length:
+            chunks.append(separator.join(current))
+            tail = []
+            tail_length = 0
+            for previous in reversed(current):
+                if tail_length + len(previous) + len(separator) > overlap:
+                    break
+                tail.insert(0, previous)
+                tail_length += len(previous) + len(separator)
+            current = tail
+            length = len(separator.join(tail))
+            added = len(unit) + (len(separator) if current else 0)
+            if length + added > max_length:
+                current = []
+                length = 0
+                added = len(unit)
+        current.append(unit)
+        length += added
+    if current:
+        chunks.append(separator.join(current))
+    return chunks
+
+
+def split_text(text: str, chunk_size: int, overlap: int = 0) -> list[str]:
+    """
+    Splits text on sentence or word boundaries into chunks of at most chunk_size characters.
+
+    :param text: the text to split
+    :param chunk_size: max. length of a chunk
+    :param overlap: max. number of characters repeated from the end of the previous chunk for context
+    """
+    return pack_units(split_units(text, chunk_size), chunk_size, overlap)
+
+
+def iter_chunks(texts, chunk_size: int, overlap: int = 0):
+    """
+    Like split_text for a stream of texts, e.g. the pages of a document.
+    Only the text that does not fill a chunk yet is kept in memory.
+
+    :param texts: iterable of texts that are joined with spaces
+    :param chunk_size: max. length of a chunk
+    :param overlap: max. number of characters repeated from the end of the previous chunk for context
+    """
+    buffer = ""
+    for text in texts:
+        if not text:
+            continue
+        buffer = f"{buffer} {text}" if buffer else text
+        if len(buffer) > chunk_size:
+            chunks = split_text(buffer, chunk_size, overlap)
+            yield from chunks[:-1]
+            buffer = chunks[-1]
+    if buffer:
+        yield buffer
@@ -0,0 +1,137 @@
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+
+from transcript_store import TranscriptStore
+
+# Only automatically generated transcripts in these languages are used.
+TRANSCRIPT_LANGUAGES = ["en", "de"]
+
+
+class RateLimiter:
+    """
+    Spaces calls to wait() at least 1 / requests_per_second apart, across all threads.
+    """
+
+    def __init__(self, requests_per_second: float = None):
+        self.interval = 1.0 / requests_per_second if requests_per_second else 0.0
+        self.lock = threading.Lock()
+        self.next_time = 0.0
+
+    def wait(self):
+        with self.lock:
+            now = time.monotonic()
+            start = max(now, self.next_time)
+            self.next_time = start + self.interval
+        if start > now:
+            time.sleep(start - now)
+
+
+def find_youtube_transcript(video_id: str, transcript_api=None):
+    """
+    Returns the generated transcript of the video in one of TRANSCRIPT_LANGUAGES or None.
+
+    :param transcript_api: YouTubeTranscriptApi (the default) or a stub with the same list_transcripts method
+    """
+    if transcript_api is None:
+        # Imported on first use, a summarization of stored transcripts does not need it.
+        from youtube_transcript_api import YouTubeTranscriptApi
+        transcript_api = YouTubeTranscriptApi
+    transcripts = transcript_api.list_transcripts(video_id)
+    for transcript in transcripts:
+        if transcript.is_generated and transcript.language_code in TRANSCRIPT_LANGUAGES:
+            return transcript
+
+
+def fetch_and_store_transcript(store: TranscriptStore, video_id: str, transcript_api=None,
+                               rate_limiter: RateLimiter = None):
+    """
+    Fetches the transcript from YouTube and stores it, or remembers that there is none.
+
+    :return: the tuple (language, transcript) or None if the video has no usable transcript
+    """
+    from youtube_transcript_api import NoTranscriptFound, TranscriptsDisabled, VideoUnavailable
+
+    rate_limiter = rate_limiter or RateLimiter()
+    try:
+        rate_limiter.wait()
+        transcript = find_youtube_transcript(video_id, transcript_api)
+    except (NoTranscriptFound, TranscriptsDisabled, VideoUnavailable):
+        transcript = None
+    if transcript is None:
+        store.mark_missing(video_id)
+        return None
+    rate_limiter.wait()
+    entries = transcript.fetch()
+    # youtube-transcript-api 1.x returns a FetchedTranscript, 0.6 a list of dicts.
+    if hasattr(entries, "to_raw_data"):
+        entries = entries.to_raw_data()
+    transcript_text = " ".join(entry["text"] for entry in entries)
+    store.put(video_id, transcript.language_code, transcript_text, segments=entries)
+    return transcript.language_code, transcript_text
+
+
+class TranscriptPrefetcher:
+    """
+    Warms the transcript store for many videos in background threads.
+
+    Videos that are already stored or known to have no transcript are skipped,
+    so that the summarization afterwards only reads the local database.
+    """
+
+    def __init__(self, store: TranscriptStore, transcript_api=None, max_workers: int = 4,
+                 requests_per_second: float = 5.0):
+        """
+        :param store: where the transcripts are stored
+        :param transcript_api: YouTubeTranscriptApi (the default) or a stub with the same list_transcripts method
+        :param max_workers: number of parallel fetches
+        :param requests_per_second: limits the requests to YouTube of all workers together, None for no limit
+        """
+        self.store = store
+        self.transcript_api = transcript_api
+        self.rate_limiter = RateLimiter(requests_per_second)
+        self.executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="transcript-prefetch")
+        # Reentrant because a done callback runs in the submitting thread if the future is already done.
+        self.lock = threading.RLock()
+        self.pending = {}
+
+    def prefetch(self, video_ids) -> dict[str, Future]:
+        """
+        Starts fetching the transcripts of video_ids that are not stored yet.
+
+        :return: a dict from video id to a future that results in True if a transcript was stored
+            and False if the video has none, only for the videos that are fetched
+        """
+        video_ids = list(dict.fromkeys(video_ids))
+        skipped = self.store.stored_ids(video_ids) | self.store.missing_ids(video_ids)
+        futures = {}
+        with self.lock:
+            for video_id in video_ids:
+                if video_id in skipped:
+                    continue
+                future = self.pending.get(video_id)
+                if future is None:
+                    future = self.executor.submit(self.fetch, video_id)
+                    self.pending[video_id] = future
+                    future.add_done_callback(lambda _, done_id=video_id: self.done(done_id))
+                futures[video_id] = future
+        return futures
+
+    def fetch(self, video_id: str) -> bool:
+        return fetch_and_store_transcript(self.store, video_id, self.transcript_api, self.rate_limiter) is not None
+
+    def done(self, video_id: str):
+        with self.lock:
+            self.pending.pop(video_id, None)
+
+    def close(self, wait: bool = True):
+        """
+        Stops the worker threads, without wait the fetches that have not started yet are cancelled.
+        """
+        self.executor.shutdown(wait=wait, cancel_futures=not wait)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close(wait=exc_type is None)
@@ -0,0 +1,243 @@
+import json
+import os
+import threading
+import time
+import zlib
+
+from dotenv import load_dotenv
+
+from sqlite_database import SqliteDatabase
+
+
+class TranscriptStore:
+    """
+    Stores the transcripts of YouTube videos in the table transcript.
+
+    Transcripts are stored zlib compressed in the column data, the column format tells how to read a row.
+    Rows of older versions have format FORMAT_TEXT and are still read, migrate() compresses them.
+    With store_segments the timed segments are additionally stored in compressed blocks
+    in the table transcript_segment, so that time ranges can be read without decompressing everything.
+    Videos without a usable transcript are remembered in the table transcript_missing for missing_ttl seconds.
+    """
+
+    FORMAT_TEXT = 0
+    FORMAT_ZLIB = 1
+
+    # SQLite limits the number of variables of a statement.
+    max_batch_size = 500
+    compression_level = 6
+    store_segments = False
+    segments_per_block = 100
+    missing_ttl = 24 * 3600
+
+    instances = {}
+    instances_lock = threading.Lock()
+
+    def __init__(self, database: SqliteDatabase):
+        self.database = database
+        with database.lock:
+            conn = database.conn
+            conn.execute('''
+                CREATE TABLE IF NOT EXISTS transcript (
+                    id TEXT PRIMARY KEY NOT NULL,
+                    language TEXT NOT NULL,
+                    transcript TEXT NOT NULL
+                )
+            ''')
+            columns = [row[1] for row in conn.execute("PRAGMA table_info(transcript)")]
+            if "format" not in columns:
+                conn.execute(f"ALTER TABLE transcript ADD COLUMN format INTEGER NOT NULL DEFAULT {self.FORMAT_TEXT}")
+            if "data" not in columns:
+                conn.execute("ALTER TABLE transcript ADD COLUMN data BLOB")
+            conn.execute('''
+                CREATE TABLE IF NOT EXISTS transcript_segment (
+                    id TEXT NOT NULL,
+                    block INTEGER NOT NULL,
+                    start REAL NOT NULL,
+                    end REAL NOT NULL,
+                    data BLOB NOT NULL,
+                    PRIMARY KEY (id, block)
+                )
+            ''')
+            conn.execute('''
+                CREATE TABLE IF NOT EXISTS transcript_missing (
+                    id TEXT PRIMARY KEY NOT NULL,
+                    checked_at REAL NOT NULL
+                )
+            ''')
+            conn.commit()
+
+    @classmethod
+    def for_database(cls, db_path: str) -> "TranscriptStore":
+        """
+        Returns the store of db_path that is shared within this process, the schema is only checked once.
+        """
+        with cls.instances_lock:
+            if db_path not in cls.instances:
+                cls.instances[db_path] = cls(SqliteDatabase.for_path(db_path))
+            return cls.instances[db_path]
+
+    def compress(self, text: str) -> bytes:
+        return zlib.compress(text.encode("utf-8"), self.compression_level)
+
+    def decode(self, transcript_format: int, transcript: str, data: bytes) -> str:
+        if transcript_format == self.FORMAT_TEXT:
+            return transcript
+        if transcript_format == self.FORMAT_ZLIB:
+            return zlib.decompress(data).decode("utf-8")
+        raise ValueError(f"unknown transcript format {transcript_format}")
+
+    def get(self, video_id: str):
+        """
+        Returns the tuple (language, transcript) or None if the video is not stored.
+        """
+        with self.database.lock:
+            row = self.database.conn.execute("SELECT language, format, transcript, data FROM transcript WHERE id = ?",
+                                             (video_id,)).fetchone()
+        if row is None:
+            return None
+        return row[0], self.decode(*row[1:])
+
+    def get_many(self, video_ids) -> dict:
+        """
+        Returns a dict from video id to (language, transcript) for all stored videos of video_ids.
+        """
+        video_ids = list(dict.fromkeys(video_ids))
+        result = {}
+        for start in range(0, len(video_ids), self.max_batch_size):
+            batch = video_ids[start:start + self.max_batch_size]
+            placeholders = ", ".join("?" * len(batch))
+            with self.database.lock:
+                rows = self.database.conn.execute(
+                    f"SELECT id, language, format, transcript, data FROM transcript WHERE id IN ({placeholders})",
+                    batch).fetchall()
+            for video_id, language, transcript_format, transcript, data in rows:
+                result[video_id] = (language, self.decode(transcript_format, transcript, data))
+        return result
+
+    def stored_ids(self, video_ids) -> set:
+        """
+        Returns the ids of video_ids that have a stored transcript without reading the transcripts.
+        """
+        video_ids = list(dict.fromkeys(video_ids))
+        result = set()
+        for start in range(0, len(video_ids), self.max_batch_size):
+            batch = video_ids[start:start + self.max_batch_size]
+            placeholders = ", ".join("?" * len(batch))
+            with self.database.lock:
+                rows = self.database.conn.execute(f"SELECT id FROM transcript WHERE id IN ({placeholders})",
+                                                  batch).fetchall()
+            result.update(row[0] for row in rows)
+        return result
+
+    def put(self, video_id: str, language: str, transcript: str, segments=None):
+        """
+        Stores a transcript.
+
+        :param segments: optional segments with text, start and duration like returned by transcript.fetch(),
+            only stored if store_segments is set
+        """
+        self.put_many([(video_id, language, transcript)])
+        if segments is not None and self.store_segments:
+            self.put_segments(video_id, segments)
+
+    def put_many(self, rows):
+        """
+        Stores many (video id, language, transcript) tuples in one transaction.
+        """
+        compressed = [(video_id, language, "", self.FORMAT_ZLIB, self.compress(transcript))
+                      for video_id, language, transcript in rows]
+        with self.database.lock:
+            with self.database.conn:
+                self.database.conn.executemany(
+                    "INSERT OR REPLACE INTO transcript (id, language, transcript, format, data) VALUES (?, ?, ?, ?, ?)",
+                    compressed)
+
+    def mark_missing(self, video_id: str):
+        """
+        Remembers that video_id has no usable transcript.
+        """
+        with self.database.lock:
+            with self.database.conn:
+                self.database.conn.execute("INSERT OR REPLACE INTO transcript_missing VALUES (?, ?)",
+                                           (video_id, time.time()))
+
+    def missing_ids(self, video_ids) -> set:
+        """
+        Returns the ids of video_ids that were found to have no transcript within the last missing_ttl seconds.
+        """
+        video_ids = list(dict.fromkeys(video_ids))
+        checked_after = time.time() - self.missing_ttl
+        result = set()
+        for start in range(0, len(video_ids), self.max_batch_size):
+            batch = video_ids[start:start + self.max_batch_size]
+            placeholders = ", ".join("?" * len(batch))
+            with self.database.lock:
+                rows = self.database.conn.execute(
+                    f"SELECT id FROM transcript_missing WHERE checked_at > ? AND id IN ({placeholders})",
+                    [checked_after] + batch).fetchall()
+            result.update(row[0] for row in rows)
+        return result
+
+    def put_segments(self, video_id: str, segments):
+        """
+        Stores the timed segments of a transcript in compressed blocks of segments_per_block segments.
+        """
+        # Lists of dicts from youtube-transcript-api 0.6, FetchedTranscriptSnippet dataclasses from 1.x.
+        segments = [segment if isinstance(segment, dict)
+                    else {"text": segment.text, "start": segment.start, "duration": segment.duration}
+                    for segment in segments]
+        blocks = []
+        for block, first in enumerate(range(0, len(segments), self.segments_per_block)):
+            block_segments = [
+                {"text": segment["text"], "start": segment["start"], "duration": segment["duration"]}
+                for segment in segments[first:first + self.segments_per_block]
+            ]
+            start = block_segments[0]["start"]
+            end = max(segment["start"] + segment["duration"] for segment in block_segments)
+            blocks.append((video_id, block, start, end, self.compress(json.dumps(block_segments))))
+        with self.database.lock:
+            with self.database.conn:
+                self.database.conn.execute("DELETE FROM transcript_segment WHERE id = ?", (video_id,))
+                self.database.conn.executemany("INSERT INTO transcript_segment VALUES (?, ?, ?, ?, ?)", blocks)
+
+    def get_segments(self, video_id: str, start: float = 0.0, end: float = float("inf")) -> list[dict]:
+        """
+        Returns the stored segments that overlap the time range from start to end in seconds,
+        only the blocks containing the range are decompressed.
+        """
+        with self.database.lock:
+            rows = self.database.conn.execute(
+                "SELECT data FROM transcript_segment WHERE id = ? AND end >= ? AND start <= ? ORDER BY block",
+                (video_id, start, end)).fetchall()
+        segments = []
+        for (data,) in rows:
+            for segment in json.loads(zlib.decompress(data)):
+                if segment["start"] + segment["duration"] >= start and segment["start"] <= end:
+                    segments.append(segment)
+        return segments
+
+    def migrate(self, batch_size: int = 100) -> int:
+        """
+        Compresses all rows that are still stored as plain text and returns their number.
+        Run VACUUM afterwards to shrink the database file.
+        """
+        migrated = 0
+        while True:
+            with self.database.lock:
+                rows = self.database.conn.execute(
+                    "SELECT id, language, transcript FROM transcript WHERE format = ? LIMIT ?",
+                    (self.FORMAT_TEXT, batch_size)).fetchall()
+            if not rows:
+                return migrated
+            self.put_many(rows)
+            migrated += len(rows)
+
+
+if __name__ == "__main__":
+    # Migrates youtube-transcript.db in TARGET_DIRECTORY to compressed storage.
+    load_dotenv()
+    store = TranscriptStore.for_database(f"{os.environ['TARGET_DIRECTORY']}/youtube-transcript.db")
+    print(f"Compressed {store.migrate()} transcripts.")
+    with store.database.lock:
+        store.database.conn.execute("VACUUM")
@@ -1,16 +1,14 @@
 import asyncio
-from typing import AsyncGenerator
 
 from dotenv import load_dotenv
-from google.adk.agents import BaseAgent
 from google.adk.agents.callback_context import CallbackContext
-from google.adk.agents.invocation_context import InvocationContext
 from google.adk.agents.llm_agent import LlmAgent
 from google.adk.agents.loop_agent import LoopAgent
-from google.adk.events import Event, EventActions
 from google.adk.runners import Runner
-from google.adk.sessions import InMemorySessionService
 from google.genai import types
+
+from convergence import ConvergenceAgent
+from sqlite_session_service import SqliteSessionService
 from x_prompt_de import initial_user_prompt
 
 # Load environment variables from .env file
@@ -71,24 +69,21 @@ critic_agent = LlmAgent(
 )
 
 
-class CheckCondition(BaseAgent):  # Custom agent to check state
-    def __init__(self):
-        super().__init__(name="CheckCondition")
-
-    async def _run_async_impl(self, ctx: InvocationContext) -> AsyncGenerator[Event, None]:
-        status = ctx.session.state.get(STATE_CRITICISM, "pending").strip()
-        is_done = (status == "STOP")
-        yield Event(author=self.name, actions=EventActions(escalate=is_done))  # Escalate if done
-
+# Stops the loop if the critic says STOP, or if the comment or the criticism hardly change anymore
+check_condition = ConvergenceAgent(
+    name="CheckCondition", state_keys=[STATE_CURRENT_DOC], critique_key=STATE_CRITICISM, stop_words=["STOP"]
+)
 
 # Create the LoopAgent
 root_agent = LoopAgent(
-    name="LoopAgent", sub_agents=[writer_agent, critic_agent, CheckCondition()], max_iterations=10
+    name="LoopAgent", sub_agents=[writer_agent, critic_agent, check_condition], max_iterations=10
 )
 
 # Session and Runner
 if __name__ == "__main__":
-    session_service = InMemorySessionService()
+    session_service = SqliteSessionService.for_database()
+    # Every run starts a new session, the last one stays in the database for inspection.
+    session_service.delete_session(app_name=APP_NAME, user_id=USER_ID, session_id=SESSION_ID)
     session = session_service.create_session(app_name=APP_NAME, user_id=USER_ID, session_id=SESSION_ID)
     runner = Runner(agent=root_agent, app_name=APP_NAME, session_service=session_service)
 
@@ -1,10 +1,19 @@
 import json
 import os
-import sqlite3
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from contextlib import contextmanager
+from dataclasses import dataclass
 
 import requests
 from dotenv import load_dotenv
-from youtube_transcript_api import YouTubeTranscriptApi
+
+from http_client import PooledHttpClient, shared_client
+from response_cache import ResponseCache
+from text_chunks import pack_units, split_text
+from transcript_prefetch import TranscriptPrefetcher, fetch_and_store_transcript
+from transcript_store import TranscriptStore
 
 
 class YouTubeSummarizer:
@@ -23,84 +32,113 @@ class YouTubeSummarizer:
     model = "gpt-4o-mini"
     # model = "mistral-nemo-instruct-2407"
     # model = "deepseek-r1-distill-qwen-1.5b"
+    # Longer transcripts are split into chunks that are summarized in parallel and then combined.
     max_transcript_length = 16 * 1024
+    chunk_overlap = 512
+    max_parallel_chunks = 4
+    # The final request gets the partial summaries as they are if they don't fit after that many levels.
+    max_reduction_levels = 4
+    source_description = "video transcripts"
     prompts = {
         "en": {
             "summary": "",
-            "title": "Summarize as one sentence:"
+            "title": "Summarize as one sentence:",
+            "chunk": "This is one part of a longer text. Summarize it:",
+            "combined": "Answer with a JSON object with the fields summary and title. The title summarizes the text as one sentence."
         },
         "de": {
             "summary": "Fasse in deutscher Sprache zusammen.",
-            "title": "Fasse in einem Satz in deutscher Sprache zusammen."
+            "title": "Fasse in einem Satz in deutscher Sprache zusammen.",
+            "chunk": "Dies ist ein Teil eines längeren Textes. Fasse ihn in deutscher Sprache zusammen.",
+            "combined": "Antworte mit einem JSON-Objekt mit den Feldern summary und title in deutscher Sprache. Der title fasst den Text in einem Satz zusammen."
         }
     }
 
-    load_dotenv()
+    # AWS Lambda gets its configuration from the environment variables of the function.
+    if "AWS_LAMBDA_FUNCTION_NAME" not in os.environ:
+        load_dotenv()
+
+    # Pooled keep-alive client shared by all instances, replace it to change timeouts or retries.
+    http_client: PooledHttpClient = shared_client
+
+    # Repeated requests with the same model, prompt and input are answered from youtube-transcript.db.
+    use_response_cache = True
 
-    def __init__(self, video_id: str):
+    # How the title is generated:
+    # "serial" from the summary after it is finished,
+    # "parallel" from the first title_input_length characters of the transcript while the summary is generated,
+    # "combined" together with the summary in one JSON response.
+    title_mode = "serial"
+    title_input_length = 4 * 1024
+
+    def __init__(self, video_id: str, session: requests.Session = None):
         """
         :param video_id: identifies the video at YouTube
+        :param session: optional HTTP session, defaults to the shared http_client
         """
         self.video_id = video_id
         self.language = None
-        self.conn = None
-        self.cursor = None
+        self.session = session or self.http_client
         self.transcript_text = None
         self.summary_text = None
         self.title_text = None
         self.target_dir = os.environ["TARGET_DIRECTORY"]
+        # Seconds spent in the steps transcript, summary and title of the last summarization.
+        self.timings = {}
+
+    @contextmanager
+    def timed(self, step: str):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.timings[step] = time.perf_counter() - start
 
-    def open_database(self):
-        db_path = f"{self.target_dir}/youtube-transcript.db"
-        self.conn = sqlite3.connect(db_path)
-        self.cursor = self.conn.cursor()
-        self.cursor.execute('''
-            CREATE TABLE IF NOT EXISTS transcript (
-                id TEXT PRIMARY KEY NOT NULL,
-                language TEXT NOT NULL,
-                transcript TEXT NOT NULL
-            )
-        ''')
-        self.conn.commit()
-
-    def fetch_youtube_transcript(self):
-        transcripts = YouTubeTranscriptApi.list_transcripts(self.video_id)
-        for transcript in transcripts:
-            if transcript.is_generated and transcript.language_code in ['en', 'de']:
-                return transcript
+    def db_path(self) -> str:
+        return f"{self.target_dir}/youtube-transcript.db"
+
+    def transcript_store(self) -> TranscriptStore:
+        return TranscriptStore.for_database(self.db_path())
 
     def fetch_transcript(self):
-        self.open_database()
-        self.cursor.execute("SELECT t.id, t.language, t.transcript FROM transcript t where t.id = ?", (self.video_id,))
-        row = self.cursor.fetchone()
-        if row is not None:
-            self.language = row[1]
-            self.transcript_text = row[2]
-        else:
-            transcript = self.fetch_youtube_transcript()
-            if transcript is not None:
-                self.language = transcript.language_code
-                entries = transcript.fetch()
-                self.transcript_text = " ".join(entry["text"] for entry in entries)
-                self.cursor.execute("INSERT INTO transcript VALUES (?, ?, ?)",
-                                    (self.video_id, self.language, self.transcript_text))
-                self.conn.commit()
-            else:
-                raise Exception("transcript not found")
-        self.conn.close()
+        """
+        Reads the transcript from the database or fetches and stores it.
+        Videos known to have no transcript are not requested from YouTube again.
+        """
+        store = self.transcript_store()
+        row = store.get(self.video_id)
+        if row is None and self.video_id not in store.missing_ids([self.video_id]):
+            row = fetch_and_store_transcript(store, self.video_id)
+        if row is None:
+            raise Exception("transcript not found")
+        self.language, self.transcript_text = row
 
-    def summarize_text(self, input_text: str, prompt_selector: str):
+    def build_request(self, input_text: str, prompt_selector: str):
+        """
+        Returns the chat completion request and its response cache key, the key is None if caching is disabled.
+        """
         prefix = self.prompts[self.language][prompt_selector]
         prompt = f":{prefix}\n\n{input_text}"
 
-        label_request = " After the summary list 3 labels that categorizes the text." if prompt_selector == "summary" else ""
+        if prompt_selector == "combined":
+            developer_message = (f"You are summarizing {self.source_description}. You answer with the JSON object only"
+                                 " and do not mention the source. At the end of the summary field list 3 labels"
+                                 " that categorize the text.")
+        else:
+            label_request = " After the summary list 3 labels that categorizes the text." if prompt_selector == "summary" else ""
+            developer_message = f"You are summarizing {self.source_description}. You answer with the summary only and do not mention the source.{label_request}"
+
+        cache_key = None
+        if self.use_response_cache:
+            cache_key = ResponseCache.make_key(self.model, self.url, prompt_selector, self.language,
+                                               f"{developer_message}\n:{prefix}", input_text)
 
         request = {
             "model": self.model,
             "messages": [
                 {
                     "role": "developer",
-                    "content": f"You are summarizing video transcripts. You answer with the summary only and do not mention the source.{label_request}"
+                    "content": developer_message
                 },
                 {
                     "role": "user",
@@ -109,13 +147,132 @@ class YouTubeSummarizer:
             ],
             "store": False
         }
+        if prompt_selector == "combined":
+            request["response_format"] = {"type": "json_object"}
+        return request, cache_key
+
+    def response_cache(self) -> ResponseCache:
+        return ResponseCache.for_database(self.db_path())
+
+    @staticmethod
+    def parse_combined(content: str):
+        """
+        Returns summary and title of a "combined" response, raises ValueError if it isn't the expected JSON object.
+        """
+        json_result = json.loads(content)
+        if not isinstance(json_result, dict) or not all(isinstance(json_result.get(field), str)
+                                                        for field in ("summary", "title")):
+            raise ValueError(f"not a JSON object with the fields summary and title: {content[:200]!r}")
+        return json_result["summary"], json_result["title"]
+
+    def summarize_text(self, input_text: str, prompt_selector: str):
+        request, cache_key = self.build_request(input_text, prompt_selector)
+        if cache_key is not None:
+            cached_response = self.response_cache().get(cache_key)
+            if cached_response is not None:
+                return cached_response
 
         api_key = os.getenv("OPENAI_API_KEY")
-        response = requests.post(self.url, json=request, headers={"Authorization": f"Bearer {api_key}"})
+        response = self.session.post(self.url, json=request, headers={"Authorization": f"Bearer {api_key}"})
         response.raise_for_status()
 
         json_result = json.loads(response.text)
-        return json_result.get("choices")[0].get("message").get("content")
+        content = json_result.get("choices")[0].get("message").get("content")
+        if prompt_selector == "combined":
+            # Models that ignore response_format must not leave an unusable response in the cache.
+            self.parse_combined(content)
+        if cache_key is not None:
+            self.response_cache().put(cache_key, content, self.model, prompt_selector)
+        return content
+
+    def summarize_text_stream(self, input_text: str, prompt_selector: str):
+        """
+        Like summarize_text but requests a server-sent event stream and yields the text as it arrives.
+        A cached response is yielded as a whole. Only complete responses are cached,
+        not those of a stream that breaks off.
+        """
+        request, cache_key = self.build_request(input_text, prompt_selector)
+        if cache_key is not None:
+            cached_response = self.response_cache().get(cache_key)
+            if cached_response is not None:
+                yield cached_response
+                return
+
+        request["stream"] = True
+        api_key = os.getenv("OPENAI_API_KEY")
+        parts = []
+        complete = False
+        with self.session.post(self.url, json=request, headers={"Authorization": f"Bearer {api_key}"},
+                               stream=True) as response:
+            response.raise_for_status()
+            for line in response.iter_lines():
+                # Events look like "data: {...}", the stream ends with "data: [DONE]".
+                line = line.decode("utf-8").strip()
+                if not line.startswith("data:"):
+                    continue
+                data = line[len("data:"):].strip()
+                if data == "[DONE]":
+                    complete = True
+                    break
+                choices = json.loads(data).get("choices")
+                if not choices:
+                    continue
+                if choices[0].get("finish_reason") == "stop":
+                    complete = True
+                delta = choices[0].get("delta", {}).get("content")
+                if delta:
+                    parts.append(delta)
+                    yield delta
+
+        if cache_key is not None and complete:
+            self.response_cache().put(cache_key, "".join(parts), self.model, prompt_selector)
+
+    def summarize_chunks(self, chunks: list[str]) -> list[str]:
+        """
+        Summarizes the chunks in parallel and returns the partial summaries in the same order.
+        """
+        if len(chunks) == 1:
+            return [self.summarize_text(chunks[0], "chunk")]
+        with ThreadPoolExecutor(max_workers=min(self.max_parallel_chunks, len(chunks))) as executor:
+            return list(executor.map(lambda chunk: self.summarize_text(chunk, "chunk"), chunks))
+
+    def condense_text(self, input_text: str) -> str:
+        """
+        Returns input_text if it fits into one request. Longer texts are split into overlapping chunks
+        and the partial summaries are combined level by level until they fit into one final request.
+        The combination stops after max_reduction_levels levels or when a level doesn't shorten them.
+        """
+        if len(input_text) <= self.max_transcript_length:
+            return input_text
+        partials = self.summarize_chunks(split_text(input_text, self.max_transcript_length, self.chunk_overlap))
+        for _ in range(self.max_reduction_levels):
+            if self.joined_length(partials) <= self.max_transcript_length:
+                break
+            condensed = self.summarize_chunks(self.group_partials(partials))
+            if self.joined_length(condensed) >= self.joined_length(partials):
+                break
+            partials = condensed
+        return "\n\n".join(partials)
+
+    @staticmethod
+    def joined_length(partials: list[str]) -> int:
+        return sum(len(partial) + 2 for partial in partials)
+
+    def group_partials(self, partials: list[str]) -> list[str]:
+        """
+        Joins partial summaries into groups of at most max_transcript_length for the next level of summaries.
+        """
+        groups = pack_units(partials, self.max_transcript_length, separator="\n\n")
+        if len(groups) == len(partials):
+            # No two partial summaries fit together, summarize them pairwise to make progress.
+            groups = ["\n\n".join(partials[i:i + 2]) for i in range(0, len(partials), 2)]
+        return groups
+
+    def summarize_long_text(self, input_text: str, prompt_selector: str):
+        """
+        Like summarize_text but also works for texts longer than max_transcript_length.
+        """
+        return self.summarize_text(self.condense_text(input_text), prompt_selector)
 
     def write_final_summary(self):
         full_summary = f"# Summarizing YouTube videos\n\nvideo URL: https://www.youtube.com/watch?v={self.video_id}\n\n## Title\n\n{self.title_text}\n\n## Summary\n\n{self.summary_text}"
@@ -124,13 +281,81 @@ class YouTubeSummarizer:
         with open(output_path, "w") as final_summary_file:
             final_summary_file.write(full_summary)
 
+    def summarize_combined(self, input_text: str):
+        """
+        Returns summary and title of input_text from a single JSON response.
+        If the model doesn't answer with the expected JSON object, they are generated one after the other.
+        """
+        input_text = self.condense_text(input_text)
+        try:
+            return self.parse_combined(self.summarize_text(input_text, "combined"))
+        except ValueError:
+            summary = self.summarize_text(input_text, "summary")
+            return summary, self.summarize_text(summary, "title")
+
+    def summarize_and_title(self):
+        """
+        Sets summary_text and title_text from transcript_text according to title_mode.
+        """
+        if self.title_mode == "combined":
+            with self.timed("summary"):
+                self.summary_text, self.title_text = self.summarize_combined(self.transcript_text)
+        elif self.title_mode == "parallel":
+            with ThreadPoolExecutor(max_workers=1) as executor:
+                title_future = executor.submit(self.summarize_text,
+                                               self.transcript_text[:self.title_input_length], "title")
+                with self.timed("summary"):
+                    self.summary_text = self.summarize_long_text(self.transcript_text, "summary")
+                # Only the time spent waiting for the title after the summary is finished.
+                with self.timed("title"):
+                    self.title_text = title_future.result()
+        else:
+            with self.timed("summary"):
+                self.summary_text = self.summarize_long_text(self.transcript_text, "summary")
+            with self.timed("title"):
+                self.title_text = self.summarize_text(self.summary_text, "title")
+
     def summarize(self):
         """
         Summarizes the transcript and writes it into a file final-summary.md.
         """
-        self.fetch_transcript()
-        self.summary_text = self.summarize_text(self.transcript_text, "summary")
-        self.title_text = self.summarize_text(self.summary_text, "title")
+        with self.timed("transcript"):
+            self.fetch_transcript()
+        self.summarize_and_title()
+        self.write_final_summary()
+
+    def summarize_stream(self):
+        """
+        Like summarize() but yields the summary text as it arrives from the model.
+
+        final-summary.md is written while streaming and gets its final layout with the title at the end.
+        The summary timing includes the time the caller spends between the yielded parts.
+        A JSON response can't be streamed as text, so title_mode "combined" generates the title like "serial".
+        """
+        with self.timed("transcript"):
+            self.fetch_transcript()
+        title_future = None
+        if self.title_mode == "parallel":
+            executor = ThreadPoolExecutor(max_workers=1)
+            title_future = executor.submit(self.summarize_text, self.transcript_text[:self.title_input_length], "title")
+            executor.shutdown(wait=False)
+        parts = []
+        output_path = f"{self.target_dir}/final-summary.md"
+        with self.timed("summary"), open(output_path, "w") as final_summary_file:
+            input_text = self.condense_text(self.transcript_text)
+            final_summary_file.write(f"# Summarizing YouTube videos\n\nvideo URL: https://www.youtube.com/watch?v={self.video_id}\n\n## Summary\n\n")
+            final_summary_file.flush()
+            for delta in self.summarize_text_stream(input_text, "summary"):
+                parts.append(delta)
+                final_summary_file.write(delta)
+                final_summary_file.flush()
+                yield delta
+        self.summary_text = "".join(parts)
+        with self.timed("title"):
+            if title_future is not None:
+                self.title_text = title_future.result()
+            else:
+                self.title_text = self.summarize_text(self.summary_text, "title")
         self.write_final_summary()
 
     def jsonSummary(self):
@@ -146,3 +371,61 @@ class YouTubeSummarizer:
         }
 
         return json.dumps(summary_dict)
+
+
+@dataclass
+class SummaryResult:
+    """
+    The outcome of summarizing one video of a batch: either language, title and summary or the error.
+    """
+    video_id: str
+    language: str = None
+    title: str = None
+    summary: str = None
+    error: Exception = None
+
+
+def summarize_many(video_ids, concurrency: int = 4, fetch_concurrency: int = None, summary_concurrency: int = None):
+    """
+    Summarizes many videos with a bounded pool of worker threads.
+
+    All workers share the transcript store and the pooled HTTP client.
+    Missing transcripts are prefetched by a separate pool of fetch_concurrency threads,
+    the summarization of a video starts as soon as its transcript is stored.
+    No final-summary.md is written, the results are yielded instead.
+
+    :param video_ids: identify the videos at YouTube
+    :param concurrency: number of worker threads
+    :param fetch_concurrency: max. parallel transcript fetches, defaults to concurrency
+    :param summary_concurrency: max. parallel summaries, defaults to concurrency,
+        long transcripts additionally use up to max_parallel_chunks requests each
+    :return: generator of SummaryResult in the order the videos are finished
+    """
+    summary_limit = threading.BoundedSemaphore(summary_concurrency or concurrency)
+    video_ids = list(video_ids)
+    summarizers = [YouTubeSummarizer(video_id) for video_id in video_ids]
+    if not summarizers:
+        return
+    prefetcher = TranscriptPrefetcher(summarizers[0].transcript_store(), max_workers=fetch_concurrency or concurrency)
+    prefetches = prefetcher.prefetch(video_ids)
+
+    def summarize_one(summarizer: YouTubeSummarizer) -> SummaryResult:
+        if summarizer.video_id in prefetches:
+            prefetches[summarizer.video_id].result()
+        summarizer.fetch_transcript()
+        with summary_limit:
+            summarizer.summarize_and_title()
+        return SummaryResult(summarizer.video_id, summarizer.language, summarizer.title_text, summarizer.summary_text)
+
+    executor = ThreadPoolExecutor(max_workers=concurrency)
+    try:
+        futures = {executor.submit(summarize_one, summarizer): summarizer.video_id for summarizer in summarizers}
+        for future in as_completed(futures):
+            try:
+                yield future.result()
+            except Exception as e:
+                yield SummaryResult(futures[future], error=e)
+    finally:
+        # Also reached when the caller stops iterating early: drop the videos that have not been started.
+        prefetcher.close(wait=False)
+        executor.shutdown(wait=True, cancel_futures=True)